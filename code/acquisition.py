@@ -0,0 +1,159 @@
+'''
+Take raw sensor readings for one group of devices (e.g. serial PMS5003 or I2C BME280/LTR559/gas) in a separate process and
+pass the readings back to the main process through a shared memory ring buffer, so a stalled bus cannot delay the other sensors
+'''
+
+import time
+import struct
+import multiprocessing
+from multiprocessing import shared_memory
+from sensor_registry import CHANNELS, DEVICES, take_readings
+
+MAX_VALUES = 3 # maximum number of raw values in one reading (pm sensor records PM1.0, PM2.5 and PM10)
+STATUS_OK = 0 # reading was taken successfully
+STATUS_FAILED = 1 # sensor failed to return a reading (e.g. PMS5003 timeout)
+INTERVAL_POLL = 0.5 # longest sleep between checking for a new adaptive delay set by the main process (secs)
+STALL_GRACE = 120 # seconds an acquisition process may run beyond its longest sensor duration before it is assumed to have stalled (e.g. in a driver call) and is stopped
+LOCK_TIMEOUT = 1 # seconds to wait for the buffer lock (a process stopped while holding the lock never releases it)
+
+HEADER = struct.Struct('<QQQ') # number of readings written, number of readings read, number of readings dropped because buffer was full
+SLOT = struct.Struct('<idIdI' + 'd' * MAX_VALUES) # sensor number, timestamp, status, delay after which reading was taken, number of values, values
+
+
+class RingBuffer(): # fixed size buffer in shared memory with one writing process and one reading process
+    def __init__(self, capacity, shm=None, lock=None):
+        self.capacity = capacity # number of readings which can be stored before the reading process must catch up
+        self.shm = shm if shm is not None else shared_memory.SharedMemory(create=True, size=HEADER.size + SLOT.size * capacity)
+        self.lock = lock if lock is not None else multiprocessing.Lock() # protects the header, which both processes update
+        if shm is None:
+            HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+
+    def __reduce__(self): # allow buffer to be passed to the acquisition process
+        return (RingBuffer, (self.capacity, self.shm, self.lock))
+
+    def put(self, sensor_num, timestamp, status, interval, values): # add reading to buffer - returns False if buffer is full and reading was dropped
+        count = len(values)
+        values = list(values) + [0.0] * (MAX_VALUES - count) # pad readings with fewer than 'MAX_VALUES' values
+        with self.lock:
+            written, read, dropped = HEADER.unpack_from(self.shm.buf, 0)
+            if written - read >= self.capacity: # main process has fallen behind - drop newest reading rather than block acquisition
+                HEADER.pack_into(self.shm.buf, 0, written, read, dropped + 1)
+                return False
+            SLOT.pack_into(self.shm.buf, HEADER.size + SLOT.size * (written % self.capacity), sensor_num, timestamp, status, interval, count, *values)
+            HEADER.pack_into(self.shm.buf, 0, written + 1, read, dropped)
+        return True
+
+    def get_all(self): # remove and return all readings currently stored in buffer as (sensor number, timestamp, status, interval, values) tuples
+        readings = []
+        if not self.lock.acquire(timeout=LOCK_TIMEOUT): # acquisition process was stopped while writing
+            return readings
+        try:
+            written, read, dropped = HEADER.unpack_from(self.shm.buf, 0)
+            while read < written:
+                slot = SLOT.unpack_from(self.shm.buf, HEADER.size + SLOT.size * (read % self.capacity))
+                readings.append((slot[0], slot[1], slot[2], slot[3], slot[5:5 + slot[4]]))
+                read += 1
+            HEADER.pack_into(self.shm.buf, 0, written, read, dropped)
+        finally:
+            self.lock.release()
+        return readings
+
+    def dropped(self): # number of readings dropped because the buffer was full (read without the lock if the acquisition process was stopped while holding it)
+        if not self.lock.acquire(timeout=LOCK_TIMEOUT):
+            return HEADER.unpack_from(self.shm.buf, 0)[2]
+        try:
+            return HEADER.unpack_from(self.shm.buf, 0)[2]
+        finally:
+            self.lock.release()
+
+    def close(self): # release shared memory (main process only, once the acquisition process has finished)
+        self.shm.close()
+        self.shm.unlink()
+
+
+def acquire(group, sensors, ring, intervals): # acquisition process - take readings for each sensor in 'sensors' ((sensor number, freq, dur (secs)) tuples) at its own frequency (or the adaptive delay in 'intervals', if non-zero) until its duration has elapsed
+    devices = {} # devices used by this group, initialised inside this process
+    failed = set() # devices which could not be initialised (e.g. not connected)
+    for sensor_num, freq, dur in sensors:
+        name = CHANNELS[sensor_num].device
+        if name not in devices and name not in failed:
+            try:
+                devices[name] = DEVICES[name].init()
+            except Exception:
+                failed.add(name)
+    for sensor_num, freq, dur in sensors:
+        if CHANNELS[sensor_num].device in failed: # report failure to main process once and take no readings from this device
+            ring.put(sensor_num, time.time(), STATUS_FAILED, freq, [])
+    sensors = [sensor for sensor in sensors if CHANNELS[sensor[0]].device not in failed]
+    stime = time.time()
+    last_due = {sensor_num: None for sensor_num, freq, dur in sensors} # time at which each sensor's latest reading was due (None = no readings taken yet)
+    last_read = {} # time at which each sensor's latest reading was taken
+    end = {sensor_num: stime + dur for sensor_num, freq, dur in sensors} # time at which each sensor stops taking readings
+    freqs = {sensor_num: freq for sensor_num, freq, dur in sensors}
+    while last_due:
+        # recalculated every time, so a new adaptive delay set by the main process (after it has saved the latest reading) applies to the very next reading:
+        next_due = {num: stime if last_due[num] is None else last_due[num] + (intervals[num] or freqs[num]) for num in last_due} # time at which each sensor is next due to take a reading
+        for num in [num for num in next_due if next_due[num] >= end[num]]: # all readings for this sensor are complete
+            del last_due[num], next_due[num]
+        if not next_due:
+            break
+        sensor_num = min(next_due, key=next_due.get) # sensor due to take a reading soonest
+        delay = next_due[sensor_num] - time.time()
+        if delay > 0:
+            time.sleep(min(delay, INTERVAL_POLL))
+            continue
+        device = CHANNELS[sensor_num].device
+        due = [CHANNELS[num] for num in next_due if next_due[num] <= time.time() and CHANNELS[num].device == device] # all sensors on this device which are due, so the device is only stabalised once
+        for channel, raw, error in take_readings(due, devices[device]):
+            now = time.time()
+            interval = intervals[channel.number] or freqs[channel.number] # delay before this reading was due (adaptive delay set by main process, otherwise 'freq')
+            elapsed = now - last_read[channel.number] if channel.number in last_read else interval # delay after which this reading was actually taken (longer than 'interval' if the previous reading was slow)
+            if error is None:
+                ring.put(channel.number, now, STATUS_OK, elapsed, raw)
+            else: # reading failed (e.g. PMS5003 timeout) - report failure to main process and continue with other sensors
+                ring.put(channel.number, now, STATUS_FAILED, elapsed, [])
+            last_read[channel.number] = now
+            last_due[channel.number] = now if now - next_due[channel.number] >= interval else next_due[channel.number] # if a whole interval was missed while this reading was being taken (e.g. PMS5003 timeout), the missed readings are skipped and the next reading is due one interval after this one - never several readings back-to-back to catch up
+
+
+class AcquisitionGroup(): # runs 'acquire' for one group of devices in its own process
+    def __init__(self, group, sensors, capacity, intervals):
+        self.group = group
+        self.sensors = sensors
+        self.ring = RingBuffer(capacity)
+        self.process = multiprocessing.Process(target=acquire, args=(group, sensors, self.ring, intervals), daemon=True)
+        self.deadline = None # time by which the process should have finished
+        self.stalled = False # whether the process was stopped for running past 'deadline'
+
+    def start(self):
+        self.deadline = time.time() + max(dur for sensor_num, freq, dur in self.sensors) + STALL_GRACE
+        self.process.start()
+
+    def overdue(self):
+        return self.process.is_alive() and time.time() > self.deadline
+
+    def terminate(self): # stop a stalled process
+        self.stalled = True
+        self.process.terminate()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def failed(self): # whether the acquisition process stopped with an error
+        return self.process.exitcode not in (None, 0)
+
+    def close(self):
+        self.process.join()
+        self.ring.close()
+
+
+def split_groups(sensors, capacity, intervals): # create one 'AcquisitionGroup' for each bus with at least one active sensor (sensors sharing a bus share a process)
+    buses = {}
+    for sensor_num, freq, dur in sensors:
+        bus = DEVICES[CHANNELS[sensor_num].device].bus
+        buses.setdefault(bus, []).append((sensor_num, freq, dur))
+    return [AcquisitionGroup(bus, bus_sensors, capacity, intervals) for bus, bus_sensors in buses.items()]
@@ -0,0 +1,38 @@
+'''
+Adjust the delay between readings of a sensor based on how quickly its readings are changing - readings are taken more often
+while the readings change quickly (e.g. a PM2.5 spike) and less often while the readings are stable
+'''
+
+import math
+from collections import deque
+
+WINDOW = 5 # number of recent readings used to calculate the rate of change and standard deviation
+TIGHTEN = 0.5 # delay between readings is multiplied by this when readings change quickly
+RELAX = 1.5 # delay between readings is multiplied by this when readings are stable
+
+
+class AdaptiveInterval(): # delay between readings for one sensor, updated after each reading
+    def __init__(self, min_interval, max_interval, threshold, freq):
+        self.min_interval = min_interval # shortest delay between readings (secs)
+        self.max_interval = max_interval # longest delay between readings (secs)
+        self.threshold = threshold # change per minute (or standard deviation) above which readings are taken more often
+        self.interval = min(max(freq, min_interval), max_interval) # start at the delay set in 'sensors', within the allowed range
+        self.history = deque(maxlen=WINDOW) # (time, values) of recent readings
+
+    def update(self, timestamp, values): # add latest reading and return the delay before the next reading
+        self.history.append((timestamp, values))
+        if len(self.history) < 2:
+            return self.interval
+        previous_time, previous_values = self.history[-2]
+        elapsed = max(timestamp - previous_time, 1e-6)
+        rate = max(abs(value - previous) for value, previous in zip(values, previous_values)) / elapsed * 60 # largest change per minute of any value (e.g. PM1.0, PM2.5 or PM10)
+        spread = max(self.std([reading[1][i] for reading in self.history]) for i in range(len(values))) # largest standard deviation of any value over recent readings
+        if rate > self.threshold or spread > self.threshold: # readings changing quickly - take readings more often
+            self.interval = max(self.min_interval, self.interval * TIGHTEN)
+        elif rate < self.threshold / 2 and spread < self.threshold / 2: # readings stable - take readings less often
+            self.interval = min(self.max_interval, self.interval * RELAX)
+        return self.interval
+
+    def std(self, values): # standard deviation of 'values'
+        mean = sum(values) / len(values)
+        return math.sqrt(sum((value - mean) ** 2 for value in values) / len(values))
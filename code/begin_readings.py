@@ -3,34 +3,74 @@ Configures proximity sensor as button to begin sensor readings after Raspberry P
 File run at startup as a cron job ('sudo crontab -e')
 '''
 
+import time
+START_TIME = time.monotonic() # time at which this script started, for the startup timing report
 import sys
 path = '/home/ecoswell/RaspberryPi-Sensor' # path to folder storing 'sensor_settings' module
 sys.path.append(path) # enable importing module ('sensor_settings') from outside directory
-import time
+import os
 import threading
-import requests
 import sensor_settings
-from sensor_readings import SensorReadings
 from lcd_display import display_text, backlight_off, backlight_on
 
+fast_start = sensor_settings.fast_start # boolean which stores whether heavy modules and devices should only be initialised when first needed
+TIMING_FILE = '/home/ecoswell/RaspberryPi-Sensor/code/startup_timing.txt' # file storing time taken by each phase of start up
+timings = [] # (phase, seconds since script started) for each phase of start up
+timings_lock = threading.Lock() # phases may be recorded by the connectivity check thread
+
+def record_phase(phase): # record time at which start up 'phase' completed and rewrite startup timing report
+    with timings_lock:
+        timings.append((phase, time.monotonic() - START_TIME))
+        try:
+            with open('/proc/uptime', 'r') as f:
+                boot_offset = float(f.read().split()[0]) - (time.monotonic() - START_TIME) # seconds between Raspberry Pi boot and this script starting
+        except (OSError, ValueError):
+            boot_offset = None
+        try:
+            with open(TIMING_FILE, 'w') as f:
+                if boot_offset is not None:
+                    f.write(f'script started: {boot_offset:.2f} s after boot\n')
+                previous = 0
+                for name, elapsed in timings:
+                    f.write(f'{name}: {elapsed:.2f} s (+{elapsed - previous:.2f} s)\n') # time since script started and time taken by this phase
+                    previous = elapsed
+        except OSError:
+            pass
+
+def check_internet(timeout): # check if Raspberry Pi is connected to internet and display welcome message
+    import requests # imported here as importing 'requests' is slow
+    try:
+        requests.get('https://www.google.com/', timeout=timeout) # check if Raspberry Pi is connected to internet (request will cause error if not connected to internet --> except statement triggered)
+        display_text('Welcome!\nInternet \nconnected', 20) 
+    except:
+        display_text('Welcome!\nInternet not\n connected', 20) 
+    record_phase('connectivity check')
+
+def readings_active(): # whether sensor readings are currently being taken (background threads such as data compression are daemon threads and are ignored)
+    return len([thread for thread in threading.enumerate() if not thread.daemon]) > 1
+
+record_phase('imports')
+
 try:
     # transitional fix for breaking change in LTR559
     from ltr559 import LTR559
     ltr559 = LTR559() # initialise LTR559 light/proximity sensor
 except ImportError:
     import ltr559
-   
+record_phase('proximity sensor initialised')
 
-time.sleep(10)
-
-try:
-    requests.get('https://www.google.com/') # check if Raspberry Pi is connected to internet (request will cause error if not connected to internet --> except statement triggered)
-    display_text('Welcome!\nInternet \nconnected', 20) 
-except:
-    display_text('Welcome!\nInternet not\n connected', 20) 
+if fast_start == True:
+    threading.Thread(target=check_internet, args=(3,), daemon=True).start() # check internet connection in background so button is responsive immediately
+else:
+    from sensor_readings import SensorReadings # initialise sensors at boot
+    record_phase('sensor modules loaded')
+    time.sleep(10)
+    check_internet(None)
 
 calculate_gas_factor = sensor_settings.calculate_gas_factor # boolean which stores whether user wishes to calibrate the gas sensors      
 
+record_phase('button ready')
+
 while True: 
     proximity = ltr559.get_proximity() # get proximity above proximity sensor
     if proximity > 1500: # if proximity crosses threshold, indicates that user has put finger on proximity sensor (i.e. starts pressing 'button')
@@ -44,7 +84,7 @@ while True:
                 break
             else:
                 pass
-        if button_pressed == True and threading.active_count() <= 1: # if user has held finger on proximity sensor for at least 5 seconds (i.e. pressed button to start sensor readings) and no other threads are currently active (i.e. sensor not currently taking readings)
+        if button_pressed == True and not readings_active(): # if user has held finger on proximity sensor for at least 5 seconds (i.e. pressed button to start sensor readings) and no other threads are currently active (i.e. sensor not currently taking readings)
             if calculate_gas_factor == True:
                 display_text('Gas calibration\n starting in 10 mins',18) # display status message on LCD 
                 time.sleep(600) # delay to allow gas sensors to warm up
@@ -52,12 +92,13 @@ while True:
                 display_text('Sensor readings\n starting in 2 mins',18) # display status message on LCD 
                 time.sleep(120) # delay to allow user to place sensor in desired location to take readings
             display_text('Sensor readings\n have started',20)
+            from sensor_readings import SensorReadings # loads sensor modules on first use if 'fast_start' is True
             sensor_thread = threading.Thread(target=SensorReadings().main) # create new thread to take sensor readings in background
             sensor_thread.start() # start background thread to take sensor readings
             time.sleep(10) 
             display_text('',1)
             backlight_off() # turn off LCD backlight
-        elif button_pressed == True and threading.active_count() > 1: # if user has held finger on proximity sensor for at least 5 seconds (i.e. pressed button to start sensor readings) and another thread is currently active (i.e. sensor is currently taking readings)
+        elif button_pressed == True and readings_active(): # if user has held finger on proximity sensor for at least 5 seconds (i.e. pressed button to start sensor readings) and another thread is currently active (i.e. sensor is currently taking readings)
             display_text('Sensor currently active!\nContinue to hold for 20\n to reboot sensor.',13)
             while time.time() - stime < 25: # continue looping for 25 seconds after user first pressed proximity sensor, checking whether user's finger is still on proximity sensor
                 proximity = ltr559.get_proximity() # get proximity above proximity sensor
@@ -0,0 +1,133 @@
+'''
+Live dashboard on the sensor LCD screen - cycles through each active sensor, showing its latest reading and a sparkline of recent readings.
+Only the parts of the screen which have changed are redrawn, at most 'dashboard_fps' times per second, in a low priority background thread
+so drawing never delays sensor readings (or heats the CPU enough to affect temperature compensation)
+'''
+
+import os
+import time
+import threading
+from array import array
+import lcd_display
+
+CPU_BUDGET = 0.05 # maximum fraction of one CPU core used for drawing
+MESSAGE_HOLD = 10 # seconds for which status messages (e.g. 'Failed to read PMS5003') are left on screen before the dashboard is redrawn
+TEXT_COLOUR = (255, 255, 255)
+BACK_COLOUR = (0, 170, 170) # same as 'display_text'
+# screen regions (x0, y0, x1, y1) - each is only redrawn when its contents change:
+TITLE_BOX = (0, 0, 159, 15) # sensor heading and page number
+VALUE_BOX = (0, 16, 159, 43) # latest reading
+SPARK_BOX = (0, 44, 159, 79) # sparkline of recent readings
+
+
+class History(): # last 'size' readings of one sensor, stored in a fixed-size array so memory use does not grow during long sessions
+    def __init__(self, size):
+        self.readings = array('d', [0.0] * size)
+        self.size = size
+        self.index = 0 # position of next reading in 'readings'
+        self.count = 0 # number of readings stored (up to 'size')
+        self.version = 0 # incremented on every reading so the dashboard knows when to redraw
+
+    def add(self, value):
+        self.readings[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        self.version += 1
+
+    def latest(self):
+        return self.readings[self.index - 1] if self.count else None
+
+    def values(self): # readings from oldest to newest
+        if self.count < self.size:
+            return self.readings[:self.count].tolist()
+        return (self.readings[self.index:] + self.readings[:self.index]).tolist()
+
+
+class Dashboard(): # class containing methods to draw the dashboard on the LCD
+    def __init__(self, channels, history, page_secs, fps):
+        self.channels = channels # channels shown on the dashboard, in the order they are cycled through
+        self.history = {channel.name: History(history) for channel in channels} # recent readings of each channel (by name)
+        self.display_value = {channel.name: channel.display_value for channel in channels} # index of the value shown for each channel (e.g. PM2.5 for particulate matter)
+        self.lock = threading.Lock() # protects 'history', which is added to by the threads saving readings
+        self.page_secs = page_secs # seconds each channel is shown for
+        self.frame_time = 1 / fps # minimum seconds between frames
+        self.page = 0 # index in 'channels' of the channel being shown
+        self.page_start = time.monotonic()
+        self.drawn = {} # contents of each screen region when it was last drawn (empty = whole screen must be redrawn)
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.draw_loop, daemon=True) # daemon thread so it does not count as an active sensor reading
+        self.thread.start()
+
+    def stop(self): # stop drawing once readings are complete
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def update(self, sensor, values): # record latest reading of 'sensor' - only stores the value shown, drawing is done by the dashboard thread
+        if sensor in self.history:
+            with self.lock:
+                self.history[sensor].add(values[self.display_value[sensor]])
+
+    def draw_loop(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19) # lowest priority for this thread only (Linux)
+        except (AttributeError, OSError):
+            pass
+        lcd_display.backlight_on()
+        delay = 0
+        while not self.stopped.wait(delay):
+            cpu_start = time.thread_time()
+            self.draw_frame()
+            cpu_used = time.thread_time() - cpu_start
+            delay = max(self.frame_time, cpu_used / CPU_BUDGET) # slower frame rate if drawing is slow, so at most 'CPU_BUDGET' of the CPU is used
+
+    def draw_frame(self): # redraw the screen regions which have changed since the last frame
+        if time.monotonic() - lcd_display.message_time < MESSAGE_HOLD: # status message is being displayed
+            self.drawn = {} # redraw whole screen once message has been displayed for long enough
+            return
+        if time.monotonic() - self.page_start >= self.page_secs: # show next channel
+            self.page = (self.page + 1) % len(self.channels)
+            self.page_start = time.monotonic()
+        channel = self.channels[self.page]
+        history = self.history[channel.name]
+        regions = {TITLE_BOX: self.page, VALUE_BOX: (self.page, history.version), SPARK_BOX: (self.page, history.version)}
+        changed = [box for box, contents in regions.items() if self.drawn.get(box) != contents]
+        if not changed:
+            return
+        with self.lock:
+            latest, values = history.latest(), history.values()
+        with lcd_display.lock:
+            if time.monotonic() - lcd_display.message_time < MESSAGE_HOLD: # message was displayed while waiting for the LCD
+                self.drawn = {}
+                return
+            lcd_display.init_display()
+            draw = lcd_display.draw
+            for box in changed:
+                draw.rectangle(box, BACK_COLOUR)
+                if box == TITLE_BOX:
+                    draw.text((2, 1), channel.headings[channel.display_value], font=lcd_display.get_font(12), fill=TEXT_COLOUR)
+                    page = f'{self.page + 1}/{len(self.channels)}'
+                    draw.text((136, 1), page, font=lcd_display.get_font(12), fill=TEXT_COLOUR)
+                elif box == VALUE_BOX:
+                    text = 'Waiting...' if latest is None else f'{latest:g}'
+                    draw.text((2, 17), text, font=lcd_display.get_font(22), fill=TEXT_COLOUR)
+                else:
+                    self.draw_sparkline(draw, values)
+                lcd_display.display_region(box)
+        self.drawn.update(regions)
+
+    def draw_sparkline(self, draw, values): # line graph of 'values' scaled to fill 'SPARK_BOX'
+        if not values:
+            return
+        x0, y0, x1, y1 = SPARK_BOX[0] + 2, SPARK_BOX[1] + 2, SPARK_BOX[2] - 2, SPARK_BOX[3] - 2
+        low, high = min(values), max(values)
+        scale = (y1 - y0) / (high - low) if high > low else 0
+        step = (x1 - x0) / max(len(values) - 1, 1)
+        points = [(x0 + i * step, y1 - (value - low) * scale if scale else (y0 + y1) / 2) for i, value in enumerate(values)]
+        if len(points) == 1:
+            draw.point(points, fill=TEXT_COLOUR)
+        else:
+            draw.line(points, fill=TEXT_COLOUR, width=1)
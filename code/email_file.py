@@ -14,6 +14,9 @@ from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 import os
 import time
+import sqlite3
+from storage_manager import StorageManager, FINAL_DIR, EMAILED_DIR
+from sqlite_storage import SQLiteStorage, session_of
 
 NOW = datetime.now() # get current date and time
 DATE = NOW.strftime("%d.%m.%Y") # get date when sensor readings begin in correct format
@@ -25,6 +28,7 @@ EMAIL_PASSWORD = 'uevsyybzeiccfhly' # change this to match your email app-passwo
 RECIPIENT = sensor_settings.email_address
 SUBJECT = 'Multi-sensor data '+DATE+'-'+TIME
 
+emailed = [] # data files which have been emailed
 while True: # continually try to send email
     time.sleep(10) # delay to allow Raspberry Pi to connect to internet
 
@@ -42,7 +46,7 @@ while True: # continually try to send email
         msg['Subject'] = SUBJECT # assign message subject 
 
         count = 0
-        directory = '/home/ecoswell/RaspberryPi-Sensor/data_final' # directory storing data files ready to be emailed
+        directory = FINAL_DIR # directory storing data files ready to be emailed
         for file in os.listdir(directory): # iterate over each file ready to be emailed
             count+=1
             filename = os.path.join(directory, file) 
@@ -57,11 +61,33 @@ while True: # continually try to send email
             session.quit
 
             # move each emailed file to directory storing emails which have already been emailed 
-            new_directory = '/home/ecoswell/RaspberryPi-Sensor/data_emailed'
-            for file in os.listdir(directory):
+            new_directory = EMAILED_DIR
+            emailed = os.listdir(directory)
+            for file in emailed:
                 filename = os.path.join(directory, file)
                 new_filename = os.path.join(new_directory, file)
                 os.rename(filename, new_filename)
-            break
+            break # email sent - stop retrying before tidying up, so an error below never causes the email to be sent again
     except:
         pass
+
+# compress emailed files and remove the oldest emailed files if the storage quota has been exceeded (each step is tried even if an earlier one fails):
+storage = StorageManager()
+try:
+    storage.compress_directory(EMAILED_DIR)
+    storage.wait_compression()
+except OSError:
+    pass
+if sensor_settings.storage_backend == 'sqlite': # emailed sessions no longer need to be kept in the database
+    database = None
+    try:
+        database = SQLiteStorage(flush_interval=60)
+        database.prune_sessions({session_of(file) for file in emailed} - {None})
+    except sqlite3.Error: # e.g. database locked by a session which is being saved - removed after the next email
+        pass
+    if database is not None:
+        database.close()
+try:
+    storage.enforce_quota()
+except OSError:
+    pass
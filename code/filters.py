@@ -0,0 +1,111 @@
+'''
+Streaming filters applied to each sensor reading before it is saved - each filter only keeps a fixed number of recent readings,
+and suspect readings are flagged (not removed) so the data file still contains a row for every reading
+'''
+
+from bisect import bisect_left, insort
+from collections import deque
+
+MAD_SCALE = 1.4826 # scales median absolute deviation to standard deviation for normally distributed readings
+
+
+class SortedWindow(): # last 'size' readings, kept both in arrival order (to remove the oldest) and in sorted order (to find the median)
+    # adding a reading finds its position by binary search (O(log w)) but shifts the sorted list to insert it (O(w)) - for the small windows used here
+    # (a few to a few tens of readings) the shift is a single memory move, which is quicker in Python than an O(log w) tree
+    def __init__(self, size):
+        self.size = size
+        self.readings = deque() # readings in arrival order
+        self.sorted = [] # the same readings in ascending order
+
+    def add(self, value):
+        if len(self.readings) == self.size: # remove oldest reading
+            oldest = self.readings.popleft()
+            del self.sorted[bisect_left(self.sorted, oldest)]
+        self.readings.append(value)
+        insort(self.sorted, value)
+
+    def median(self):
+        n = len(self.sorted)
+        mid = n // 2
+        if n % 2:
+            return self.sorted[mid]
+        return (self.sorted[mid - 1] + self.sorted[mid]) / 2
+
+    def kth_deviation(self, centre, k): # k-th smallest (0-based) value of |reading - centre| - found by binary search on the two sorted sides of 'centre' (O(log w))
+        split = bisect_left(self.sorted, centre)
+        below = lambda i: centre - self.sorted[split - 1 - i] # ascending distances of readings below 'centre'
+        above = lambda i: self.sorted[split + i] - centre # ascending distances of readings at or above 'centre'
+        n_below, n_above = split, len(self.sorted) - split
+        low, high = max(0, k + 1 - n_above), min(k + 1, n_below) # range of number of readings below 'centre' among the k+1 smallest deviations
+        while True:
+            i = (low + high) // 2 # readings taken from below 'centre'
+            j = k + 1 - i # readings taken from at or above 'centre'
+            if i < n_below and j > 0 and above(j - 1) > below(i): # too few readings taken from below
+                low = i + 1
+            elif i > 0 and j < n_above and below(i - 1) > above(j): # too many readings taken from below
+                high = i - 1
+            else:
+                return max(below(i - 1) if i > 0 else 0, above(j - 1) if j > 0 else 0)
+
+    def mad(self, centre): # median absolute deviation from 'centre'
+        n = len(self.sorted)
+        if n % 2:
+            return self.kth_deviation(centre, n // 2)
+        return (self.kth_deviation(centre, n // 2 - 1) + self.kth_deviation(centre, n // 2)) / 2
+
+
+class RollingMedian(): # replace each reading with the median of the last 'window' readings (removes short spikes)
+    def __init__(self, window):
+        self.window = SortedWindow(window)
+
+    def apply(self, value): # returns (filtered reading, whether reading is suspect)
+        self.window.add(value)
+        return self.window.median(), False
+
+
+class Hampel(): # flag readings more than 'n_sigmas' standard deviations (estimated from the median absolute deviation) from the median of the last 'window' readings
+    def __init__(self, window, n_sigmas=3, min_sigma=0):
+        self.window = SortedWindow(window)
+        self.n_sigmas = n_sigmas
+        self.min_sigma = min_sigma # smallest standard deviation used, so small changes in mostly constant readings (e.g. particulate matter) are not flagged
+
+    def apply(self, value): # returns (reading, whether reading is suspect) - reading is kept unchanged
+        self.window.add(value)
+        if len(self.window.readings) < 3: # too few readings to judge
+            return value, False
+        median = self.window.median()
+        sigma = max(MAD_SCALE * self.window.mad(median), self.min_sigma)
+        if sigma == 0: # most readings in the window are identical (common for particulate matter), so any different reading is a spike
+            return value, value != median
+        return value, abs(value - median) > self.n_sigmas * sigma
+
+
+class EMA(): # exponential moving average - 'alpha' between 0 and 1, smaller values smooth more
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.average = None
+
+    def apply(self, value): # returns (filtered reading, whether reading is suspect)
+        if self.average is None:
+            self.average = value
+        else:
+            self.average += self.alpha * (value - self.average)
+        return self.average, False
+
+
+FILTERS = {'median': RollingMedian, 'hampel': Hampel, 'ema': EMA} # filter names used in 'sensor_settings.py'
+
+
+class FilterPipeline(): # applies a list of filters, in order, to each value of a sensor's readings (e.g. PM1.0, PM2.5 and PM10 are filtered separately)
+    def __init__(self, specs, n_values):
+        self.filters = [[FILTERS[spec[0]](*spec[1:]) for spec in specs] for i in range(n_values)] # separate filter instances for each value
+
+    def apply(self, values): # returns (filtered values, whether any value is suspect)
+        filtered = []
+        flagged = False
+        for value, value_filters in zip(values, self.filters):
+            for value_filter in value_filters:
+                value, suspect = value_filter.apply(value)
+                flagged = flagged or suspect
+            filtered.append(value)
+        return filtered, flagged
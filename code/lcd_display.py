@@ -1,49 +1,94 @@
 '''Display status/error messages on sensor LCD screen'''
 
 import time
-import ST7735
-from PIL import Image, ImageDraw, ImageFont
-from fonts.ttf import RobotoMedium as UserFont
+import threading
 
-# create LCD class instance:
-display = ST7735.ST7735(
-    port=0,
-    cs=1,
-    dc=9,
-    backlight=12,
-    rotation=270,
-    spi_speed_hz=10000000
-    )
+# LCD is initialised on first use so that importing this module does not delay start up:
+display = None # LCD class instance
+WIDTH = None # width of LCD display to calculate text position
+HEIGHT = None # height of LCD display to calculate text position
+img = None # black canvas to draw on LCD
+draw = None
+fonts = {} # fonts already loaded, by font size
+lock = threading.Lock() # prevents two threads drawing on the LCD simultaneously
+message_time = 0 # time at which the last message was displayed (so the dashboard does not immediately draw over it)
+ROTATION = 270 # LCD is mounted sideways
 
-display.begin() # initialize display
 
-WIDTH = display.width # width of LCD display to calculate text position
-HEIGHT = display.height # height of LCD display to calculate text position
+def init_display(): # create LCD class instance and empty canvas (only runs once)
+    global display, WIDTH, HEIGHT, img, draw, Image, ImageDraw, ImageFont, UserFont
+    if display is not None:
+        return
+    import ST7735
+    from PIL import Image, ImageDraw, ImageFont
+    from fonts.ttf import RobotoMedium as UserFont
 
-# create empty black canvas to draw on LCD:
-img = Image.new('RGB', (WIDTH, HEIGHT), color=(0, 0, 0)) # create black image of same size as LCD 
-draw = ImageDraw.Draw(img) # create empty black canvas
+    # create LCD class instance:
+    lcd = ST7735.ST7735(
+        port=0,
+        cs=1,
+        dc=9,
+        backlight=12,
+        rotation=ROTATION,
+        spi_speed_hz=10000000
+        )
+
+    lcd.begin() # initialize display
+
+    WIDTH = lcd.width # width of LCD display to calculate text position
+    HEIGHT = lcd.height # height of LCD display to calculate text position
+
+    # create empty black canvas to draw on LCD:
+    img = Image.new('RGB', (WIDTH, HEIGHT), color=(0, 0, 0)) # create black image of same size as LCD
+    draw = ImageDraw.Draw(img) # create empty black canvas
+    display = lcd # set last so other threads only use display once it is fully initialised
+
+def get_font(font_size): # load font once for each font size
+    if font_size not in fonts:
+        fonts[font_size] = ImageFont.truetype(UserFont, font_size)
+    return fonts[font_size]
 
 
 def display_text(text, font_size): # display text passed to function on sensor LCD screen
-    # text settings:
-    font = ImageFont.truetype(UserFont, font_size)
-    text_colour = (255, 255, 255)
-    back_colour = (0, 170, 170)
-    size_x, size_y = draw.textsize(text, font) # size of text to be displayed on LCD screen
-    # calculate text position:
-    x = (WIDTH - size_x) / 2
-    y = (HEIGHT / 2) - (size_y / 2)
-    # draw background rectangle and write text:
-    draw.rectangle((0, 0, 160, 80), back_colour)
-    draw.text((x, y), text, font=font, fill=text_colour, align='center')
-    display.display(img)
+    global message_time
+    with lock:
+        init_display()
+        message_time = time.monotonic()
+        # text settings:
+        font = get_font(font_size)
+        text_colour = (255, 255, 255)
+        back_colour = (0, 170, 170)
+        size_x, size_y = draw.textsize(text, font) # size of text to be displayed on LCD screen
+        # calculate text position:
+        x = (WIDTH - size_x) / 2
+        y = (HEIGHT / 2) - (size_y / 2)
+        # draw background rectangle and write text:
+        draw.rectangle((0, 0, 160, 80), back_colour)
+        draw.text((x, y), text, font=font, fill=text_colour, align='center')
+        display.display(img)
+    return
+
+def display_region(box): # send only the part of the canvas inside 'box' (x0, y0, x1, y1) to the LCD, which is much quicker than sending the whole canvas - caller must hold 'lock'
+    x0, y0, x1, y1 = box
+    try:
+        from ST7735 import image_to_data
+        # canvas is rotated 270 degrees on the LCD, so canvas columns are LCD rows and canvas rows are LCD columns (counted from the right):
+        display.set_window(HEIGHT - 1 - y1, x0, HEIGHT - 1 - y0, x1)
+        pixelbytes = list(image_to_data(img.crop((x0, y0, x1 + 1, y1 + 1)), ROTATION))
+        for i in range(0, len(pixelbytes), 4096): # send in chunks, as 'display' does
+            display.data(pixelbytes[i:i + 4096])
+    except (ImportError, AttributeError): # older LCD driver - send whole canvas
+        display.display(img)
     return
 
 def backlight_off():
-    display.set_backlight(0) # turn off backlight
+    with lock:
+        init_display()
+        display.set_backlight(0) # turn off backlight
     return
 
 def backlight_on():
-    display.set_backlight(1) # turn on backlight
+    with lock:
+        init_display()
+        display.set_backlight(1) # turn on backlight
     return
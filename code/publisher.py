@@ -0,0 +1,158 @@
+'''
+Publish sensor readings live to an MQTT broker (e.g. Mosquitto running on the Raspberry Pi or on the local network) while readings are being taken -
+new readings are sent in batches every 'publish_interval_ms' milliseconds or 'publish_batch_size' readings, and batches which cannot be sent
+(e.g. no network connection) are kept in a folder on the SD card and sent, oldest first, once the broker can be reached again
+'''
+
+import sys
+path = '/home/ecoswell/RaspberryPi-Sensor' # path to folder storing 'sensor_settings' module
+sys.path.append(path) # enable importing module ('sensor_settings') from outside directory
+import sensor_settings
+import os
+import json
+import socket
+import threading
+from collections import deque
+from storage_manager import PUBLISH_DIR
+
+PUBLISH_TIMEOUT = 5 # seconds to wait for the broker to acknowledge a batch before it is saved to be sent again later
+
+
+class Publisher(): # class containing methods to publish readings to the MQTT broker without delaying sensor readings
+    def __init__(self):
+        os.makedirs(PUBLISH_DIR, exist_ok=True)
+        self.topic = sensor_settings.mqtt_topic + '/' + socket.gethostname() # one topic per Raspberry Pi
+        self.interval = sensor_settings.publish_interval_ms / 1000 # seconds between publishing batches
+        self.batch_size = sensor_settings.publish_batch_size # readings which trigger a batch to be published before 'interval' has elapsed
+        self.queue_limit = sensor_settings.publish_queue_mb * 1024 * 1024 # maximum size of unsent batches kept on the SD card (bytes)
+        self.pending = [] # readings waiting to be published
+        self.lock = threading.Lock() # protects 'pending', which is added to by the threads taking readings
+        self.publish_lock = threading.Lock() # prevents saved batches being sent twice if 'stop' is called while a batch is being published
+        self.ready = threading.Event() # set when a full batch is waiting
+        self.stopped = threading.Event() # set when readings are complete
+        self.saved = deque() # (number, size in bytes) of each unsent batch on the SD card, oldest first - kept in memory so the folder is only listed once
+        self.saved_bytes = 0 # total size of unsent batches on the SD card
+        self.load_saved()
+        self.sequence = self.saved[-1][0] if self.saved else 0 # number of the last batch saved to the SD card (batches are sent in order)
+        self.client = None
+        self.thread = threading.Thread(target=self.publish_loop, daemon=True) # daemon thread so it does not count as an active sensor reading
+        self.thread.start()
+
+    def connect(self): # connect to broker in the background - the MQTT client reconnects automatically if the connection is lost
+        import paho.mqtt.client as mqtt # imported here so 'paho-mqtt' is only needed if readings are published
+        try:
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2) # paho-mqtt 2.x
+        except AttributeError:
+            self.client = mqtt.Client() # paho-mqtt 1.x
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.connect_async(sensor_settings.mqtt_host, sensor_settings.mqtt_port)
+        self.client.loop_start() # network traffic handled by the MQTT client's own thread
+
+    def add(self, sensor, timestamp, data, flag=None): # queue reading to be published in the next batch - never waits for the network
+        reading = {'sensor': sensor, 'time': timestamp, 'values': data}
+        if flag is not None:
+            reading['flag'] = flag
+        with self.lock:
+            self.pending.append(reading)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.ready.set()
+
+    def take_batch(self): # remove and return all pending readings
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.ready.clear()
+        return batch
+
+    def publish_loop(self): # publish a batch every 'interval' seconds (or sooner if a full batch is waiting)
+        try:
+            self.connect()
+        except Exception: # e.g. 'paho-mqtt' not installed - batches are kept on the SD card
+            self.client = None
+        while not self.stopped.is_set():
+            self.ready.wait(self.interval)
+            self.publish_pending()
+
+    def publish_pending(self): # send saved batches first (oldest first) and then the latest batch, saving it if it cannot be sent
+        with self.publish_lock:
+            batch = self.take_batch()
+            if not batch:
+                self.drain()
+            elif not (self.drain() and self.send(json.dumps({'readings': batch}))):
+                self.save_batch(batch)
+
+    def connected(self):
+        return self.client is not None and self.client.is_connected()
+
+    def send(self, payload): # publish one batch - returns whether the broker acknowledged it (only then can it be removed from the SD card)
+        if not self.connected():
+            return False
+        try:
+            info = self.client.publish(self.topic, payload, qos=1) # QoS 1 - broker acknowledges each batch
+            if info.rc != 0:
+                return False
+            info.wait_for_publish(PUBLISH_TIMEOUT)
+        except (RuntimeError, ValueError): # connection lost while waiting
+            return False
+        return info.is_published()
+
+    def batch_path(self, number):
+        return os.path.join(PUBLISH_DIR, f'{number}.json')
+
+    def load_saved(self): # find unsent batches left on the SD card by previous sessions
+        numbers = []
+        for entry in os.scandir(PUBLISH_DIR):
+            if entry.name.endswith('.tmp'): # batch which was being saved when power was lost
+                os.remove(entry.path)
+            elif entry.name.endswith('.json'):
+                numbers.append((int(entry.name.split('.')[0]), entry.stat().st_size))
+        numbers.sort()
+        self.saved.extend(numbers)
+        self.saved_bytes = sum(size for number, size in numbers)
+
+    def remove_oldest(self): # delete oldest saved batch (after sending it, or to make space)
+        number, size = self.saved.popleft()
+        self.saved_bytes -= size
+        try:
+            os.remove(self.batch_path(number))
+        except OSError:
+            pass
+
+    def drain(self): # send batches saved while the broker could not be reached - returns whether all were sent
+        while self.saved:
+            if not self.connected():
+                return False
+            try:
+                with open(self.batch_path(self.saved[0][0])) as f:
+                    payload = f.read()
+            except OSError: # batch was removed - skip it
+                self.remove_oldest()
+                continue
+            if not self.send(payload):
+                return False
+            self.remove_oldest()
+        return True
+
+    def save_batch(self, batch): # save batch to the SD card to be sent later, removing the oldest batches if the folder is full
+        self.sequence += 1
+        filepath = self.batch_path(self.sequence)
+        payload = json.dumps({'readings': batch})
+        try:
+            with open(filepath + '.tmp', 'w') as f:
+                f.write(payload)
+            os.rename(filepath + '.tmp', filepath) # rename only once complete so a partially written batch is never sent
+        except OSError: # SD card full - readings are still saved to the data files
+            return
+        self.saved.append((self.sequence, len(payload.encode())))
+        self.saved_bytes += self.saved[-1][1]
+        while self.saved_bytes > self.queue_limit and len(self.saved) > 1: # never remove the batch just saved
+            self.remove_oldest()
+
+    def stop(self, timeout=5): # publish remaining readings once readings are complete, saving them to the SD card if they cannot be sent within 'timeout' seconds
+        self.stopped.set()
+        self.ready.set()
+        self.thread.join(timeout)
+        self.publish_pending()
+        if self.client is not None:
+            self.client.disconnect() # every batch has now been acknowledged by the broker or saved to the SD card
+            self.client.loop_stop()
@@ -11,22 +11,37 @@ import threading
 import os.path
 import csv
 import math
+import multiprocessing
+import sqlite3
 from datetime import datetime
 from lcd_display import display_text, backlight_off, backlight_on
+from storage_manager import StorageManager, DATA_DIR, FINAL_DIR
+from acquisition import split_groups, STATUS_FAILED
+from adaptive_sampling import AdaptiveInterval
+from filters import FilterPipeline
+from sqlite_storage import SQLiteStorage
+from publisher import Publisher
+from dashboard import Dashboard
+from work_queue import WorkQueue
+from sensor_registry import CHANNELS, DEVICES, channel_by_name, take_readings
 
 
-try:
-    # transitional fix for breaking change in LTR559
-    from ltr559 import LTR559
-    ltr559 = LTR559() # initialise LTR559 light/proximity sensor
-except ImportError:
-    import ltr559
-from bme280 import BME280
-from pms5003 import PMS5003, ReadTimeoutError as pmsReadTimeoutError
-from enviroplus import gas
+class LazyDevice(): # initialises device on first use, so importing this module (e.g. at boot) does not wait for device setup
+    def __init__(self, init):
+        self.init = init # function which initialises and returns the device
+        self.device = None
+        self.lock = threading.Lock() # prevents two threads initialising the device simultaneously
 
-bme280 = BME280() # initialise BME280 temperature/pressure/humidity sensor
-pms5003 = PMS5003() # intitialise PMS5003 particulate sensor
+    def __getattr__(self, name): # only called for attributes not set in '__init__', i.e. the device's own methods
+        if self.device is None:
+            with self.lock:
+                if self.device is None:
+                    self.device = self.init()
+        return getattr(self.device, name)
+
+devices = {name: LazyDevice(device.init) for name, device in DEVICES.items()} # every device in 'sensor_registry.py', initialised on first use (never opened if read in an acquisition process)
+bme280 = devices['bme280'] # used directly when calculating temperature factor
+gas = devices['gas'] # used directly when calibrating gas sensors
 
 
 
@@ -39,12 +54,37 @@ class SensorReadings(): # class containing methods to take sensor readings
         self.factor = sensor_settings.factor # access factor by which temperature reading is compensated as defined by user in file 'sensor_settings.py' 
         self.calculate_temp_factor = sensor_settings.calculate_temp_factor # boolean which stores whether user wishes to calculate the temperature compensation factor
         self.calculate_gas_factor = sensor_settings.calculate_gas_factor # boolean which stores whether user wishes to calibrate the gas sensors      
-        self.sensors_dict = {1:self.temp_queue, 2:self.pressure_queue, 3:self.humidity_queue, 4:self.light_queue, 5:self.co_queue, 6:self.no2_queue, 7:self.nh3_queue, 8:self.pm_queue} # dictionary to translate between sensor number and sensor queue method (which triggers sensor execution)
-        self.queue = [] # queue stores sensors which are due to take readings - this avoids multiple sensors taking readings simultaneously and therefore prevents collisions
-        self.sensor_status = [False for i in range(8)] # queue stores status of each sensor (True = active, False = inactive)
+        self.acquisition_processes = sensor_settings.acquisition_processes # boolean which stores whether each group of devices should be read in its own process
+        self.acquisition_buffer_size = sensor_settings.acquisition_buffer_size # number of readings each acquisition process can buffer before readings are dropped
+        self.adaptive = {} # stores 'AdaptiveInterval' for each active sensor whose delay between readings adapts to how quickly readings change (by sensor name)
+        for sensor_num, (min_interval, max_interval, threshold) in sensor_settings.adaptive_sensors.items():
+            active = list(filter(lambda x: x[0] == sensor_num, self.sensors))
+            if active:
+                self.adaptive[CHANNELS[sensor_num].name] = AdaptiveInterval(min_interval, max_interval, threshold, active[0][1])
+        self.filters = {} # stores 'FilterPipeline' applied to readings of each sensor before they are saved (by sensor name)
+        for sensor_num, specs in sensor_settings.filters.items():
+            channel = CHANNELS[sensor_num]
+            self.filters[channel.name] = FilterPipeline(specs, len(channel.headings))
+        self.interval_used = {} # stores delay (secs) after which the latest reading of each sensor was queued (by sensor name)
+        self.timers = {} # timer which will queue the next reading of each adaptive sensor, with the time the latest reading was queued, the delay and the 'queue_op' arguments (by sensor name)
+        self.timers_lock = threading.Lock() # prevents a timer being re-armed while it is firing
+        self.shared_intervals = None # delay between readings of each sensor shared with acquisition processes (by sensor number)
+        self.queue = WorkQueue(sensor_settings.work_queue_size, sensor_settings.work_queue_drop) # queue stores channels which are due to take readings - this avoids multiple sensors taking readings simultaneously and therefore prevents collisions
+        self.sensor_status = {} # stores status of each active sensor by sensor number (True = active, False = inactive)
+        self.storage = StorageManager() # rotates, compresses and limits the size of data files on the SD card
+        self.storage_full = False # whether readings are currently being skipped due to lack of storage space
+        self.database = None # SQLite database storing readings (if 'storage_backend' is 'sqlite' in 'sensor_settings.py')
+        if sensor_settings.storage_backend == 'sqlite':
+            self.database = SQLiteStorage(sensor_settings.sqlite_flush_interval)
+        self.publisher = None # publishes readings live to MQTT broker (if 'publish_readings' is True in 'sensor_settings.py')
+        if sensor_settings.publish_readings:
+            self.publisher = Publisher()
+        self.dashboard = None # shows latest readings on LCD (if 'dashboard' is True in 'sensor_settings.py')
+        if sensor_settings.dashboard:
+            self.dashboard = Dashboard([CHANNELS[sensor_num] for sensor_num in dict.fromkeys(sensor[0] for sensor in self.sensors)], sensor_settings.dashboard_history, sensor_settings.dashboard_page_secs, sensor_settings.dashboard_fps) # one page per sensor, even if a sensor is listed more than once in 'sensors'
         cpu_temp = self.get_cpu_temperature() # take initial reading to stabalise sensor
         self.cpu_temps = [self.get_cpu_temperature()] * 5 # get five readings of CPU temperature
-        self.co_factor, self.no2_factor, self.nh3_factor = None, None, None # assign each gas calibration factor to 'None' as default
+        self.co_R0, self.no2_R0, self.nh3_R0 = None, None, None # assign each gas calibration factor to 'None' as default
         if os.stat('/home/ecoswell/RaspberryPi-Sensor/code/gas_factors.txt').st_size != 0: # if user has calculated calibration factor for gas readings
             with open('/home/ecoswell/RaspberryPi-Sensor/code/gas_factors.txt','r') as f: 
                 gas_factors = f.readlines()
@@ -106,271 +146,254 @@ class SensorReadings(): # class containing methods to take sensor readings
         return
         
 
-    def temp_queue(self, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'temp' method to 'queue' at set intervals to take sensor readings at desired frequency
-        self.queue_op(freq, dur, stime, self.temp) # add 'temp' method to 'queue' at set intervals to take sensor readings at desired frequency
+    def channel_queue(self, channel, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'channel' to 'queue' at set intervals to take sensor readings at desired frequency
+        self.queue_op(freq, dur, stime, channel) # add 'channel' to 'queue' at set intervals to take sensor readings at desired frequency
         time.sleep(dur)
-        self.sensor_status[0] = False # change temp sensor status to False (i.e. inactive) as all readings are now complete
+        self.sensor_status[channel.number] = False # change sensor status to False (i.e. inactive) as all readings are now complete
         backlight_on() # turn on LCD backlight
-        display_text('Temperature\n readings\n complete',20) # display sensor reading status on LCD once all readings are complete
+        display_text(channel.complete_text, channel.font_size) # display sensor reading status on LCD once all readings are complete
+        if self.dashboard is not None: # dashboard is redrawn after message (LCD stays on until all readings are complete)
+            return
         time.sleep(30)
         display_text('',1)
         backlight_off() # turn off LCD backlight
         return
 
-    def temp(self): # measure temperature
-        raw_temp = bme280.get_temperature() # take initial reading to stabalise sensor
-        time.sleep(2) 
-        sensor = 'temp'
-        freq = list(filter(lambda x: x[0] == 1, self.sensors))[0][1] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for temp sensor (sensor number 1)
-        dur = list(filter(lambda x: x[0] == 1, self.sensors))[0][2] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for temp sensor (sensor number 1)
-        data_heading = ['Temperature (*C)']
-        cpu_temp = self.get_cpu_temperature() # get current CPU temperature
+    def compensate_temp(self, raw_temp, cpu_temp): # adjust raw temp reading to compensate for CPU heating
         self.cpu_temps = self.cpu_temps[1:] + [cpu_temp] # remove oldest reading of CPU temp and append latest reading of CPU temp to 'cpu_temps'
         avg_cpu_temp = sum(self.cpu_temps) / float(len(self.cpu_temps)) # get average of CPU temp to decrease jitter
-        raw_temp = bme280.get_temperature() # get raw reading of temp
         compensated_temp = raw_temp - ((avg_cpu_temp - raw_temp) / self.factor) # temp value ajdusted to compensate for CPU heating
-        data = [compensated_temp]
-        self.save_data(sensor, freq, dur, data, data_heading)
-        return
-
-    def pressure_queue(self, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'pressure' method to 'queue' at set intervals to take sensor readings at desired frequency
-        self.queue_op(freq, dur, stime, self.pressure) # add 'pressure' method to 'queue' at set intervals to take sensor readings at desired frequency
-        time.sleep(dur)
-        self.sensor_status[1] = False # change pressure sensor status to False (i.e. inactive) as all readings are now complete
-        backlight_on() # turn on LCD backlight
-        display_text('Pressure\nreadings\ncomplete',20) # display sensor reading status on LCD once all readings are complete
-        time.sleep(30)
-        display_text('',1)
-        backlight_off() # turn off LCD backlight
-        return
-
-    def pressure(self): # measure pressue
-        pressure = bme280.get_pressure() # take initial reading to stabalise sensor
-        time.sleep(2) 
-        sensor = 'pressure'
-        freq = list(filter(lambda x: x[0] == 2, self.sensors))[0][1] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for pressure sensor (sensor number 2)
-        dur = list(filter(lambda x: x[0] == 2, self.sensors))[0][2] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for pressure sensor (sensor number 2)
-        data_heading = ['Pressure (hPa)']
-        pressure = bme280.get_pressure() # get reading of pressure
-        data = [pressure]
-        self.save_data(sensor, freq, dur, data, data_heading)
-        return
+        return compensated_temp
 
-    def humidity_queue(self, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'humidity' method to 'queue' at set intervals to take sensor readings at desired frequency
-        self.queue_op(freq, dur, stime, self.humidity) # add 'humidity' method to 'queue' at set intervals to take sensor readings at desired frequency
-        time.sleep(dur)
-        self.sensor_status[2] = False # change humidity sensor status to False (i.e. inactive) as all readings are now complete
-        backlight_on() # turn on LCD backlight
-        display_text('Humidity\nreadings\ncomplete',20) # display sensor reading status on LCD once all readings are complete
-        time.sleep(30)
-        display_text('',1)
-        backlight_off() # turn off LCD backlight
-        return
+    def co_ppm(self, co_Rs): # convert co reading from kOhm to ppm if gas sensors have been calibrated
+        if self.co_R0 != None: # if user has calculated calibration factor for gas readings
+            return math.pow(10, -1.25 * math.log10(co_Rs/self.co_R0) + 0.64) # convert co reading from kOhm to ppm (Roscoe method)
+        return co_Rs
 
-    def humidity(self): # measure humidiity
-        humidity = bme280.get_humidity() # take initial reading to stabalise sensor
-        time.sleep(2) 
-        sensor = 'humidity'
-        freq = list(filter(lambda x: x[0] == 3, self.sensors))[0][1] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for humidity sensor (sensor number 3)
-        dur = list(filter(lambda x: x[0] == 3, self.sensors))[0][2] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for humidity sensor (sensor number 3)
-        data_heading = ['Humidity (%)']
-        humidity = bme280.get_humidity() # get reading of humidity
-        data = [humidity]
-        self.save_data(sensor, freq, dur, data, data_heading)
-        return
+    def no2_ppm(self, no2_Rs): # convert no2 reading from kOhm to ppm if gas sensors have been calibrated
+        if self.no2_R0 != None: # if user has calculated calibration factor for gas readings
+            return math.pow(10, math.log10(no2_Rs/self.no2_R0) - 0.8129) # convert no2 reading from kOhm to ppm (Roscoe method)
+        return no2_Rs
 
-    def light_queue(self, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'light' method to 'queue' at set intervals to take sensor readings at desired frequency
-        self.queue_op(freq, dur, stime, self.light) # add 'light' method to 'queue' at set intervals to take sensor readings at desired frequency
-        time.sleep(dur)
-        self.sensor_status[3] = False # change light sensor status to False (i.e. inactive) as all readings are now complete
-        backlight_on() # turn on LCD backlight
-        display_text('Light \nreadings \ncomplete',20) # display sensor reading status on LCD once all readings are complete
-        time.sleep(30)
-        display_text('',1)
-        backlight_off() # turn off LCD backlight
-        return 
-
-    def light(self): # measure light intensity
-        light = ltr559.get_lux() # take initial reading to stabalise sensor
-        time.sleep(2) 
-        sensor = 'light'
-        freq = list(filter(lambda x: x[0] == 4, self.sensors))[0][1] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for light sensor (sensor number 4)
-        dur = list(filter(lambda x: x[0] == 4, self.sensors))[0][2] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for light sensor (sensor number 4)
-        data_heading = ['Light (lux)']
-        proximity = ltr559.get_proximity() # get reading of proximity
-        if proximity < 10: # no object near the sensor (small values of proximity indicate greater proximity)
-            light = ltr559.get_lux() # get reading of light intensity
-        else: # larger value of proximity --> closer proximity --> object near the sensor --> cannot take reading of light intensity
-            light = 1 # dark
-        data = [light]
-        self.save_data(sensor, freq, dur, data, data_heading)
-        return
+    def nh3_ppm(self, nh3_Rs): # convert nh3 reading from kOhm to ppm if gas sensors have been calibrated
+        if self.nh3_R0 != None: # if user has calculated calibration factor for gas readings
+            return math.pow(10, -1.8 * math.log10(nh3_Rs/self.nh3_R0) - 0.163) # convert nh2 reading from kOhm to ppm (Roscoe method)
+        return nh3_Rs
 
-    def co_queue(self, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'co' method to 'queue' at set intervals to take sensor readings at desired frequency
-        self.queue_op(freq, dur, stime, self.co) # add 'co' method to 'queue' at set intervals to take sensor readings at desired frequency
-        time.sleep(dur)
-        self.sensor_status[4] = False # change co sensor status to False (i.e. inactive) as all readings are now complete
-        backlight_on() # turn on LCD backlight
-        display_text('Carbon monoxide\nreadings \ncomplete',18) # display sensor reading status on LCD once all readings are complete
-        time.sleep(30)
-        display_text('',1)
-        backlight_off() # turn off LCD backlight
-        return 
+    def settings_for(self, sensor_num): # reading frequency and duration (mins) of sensor as defined by user in 'sensor_settings.py'
+        sensor = list(filter(lambda x: x[0] == sensor_num, self.sensors))[0] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration))
+        return sensor[1], sensor[2]
 
-    def co(self): # measures concentration of carbon monoxide (reducing) gas
-        gas_data = gas.read_all() # take initial reading to stabalise sensor
-        time.sleep(2) 
-        sensor = 'co'
-        freq = list(filter(lambda x: x[0] == 5, self.sensors))[0][1] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for co sensor (sensor number 5)
-        dur = list(filter(lambda x: x[0] == 5, self.sensors))[0][2] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for co sensor (sensor number 5)
-        data_heading = ['Carbon monoxide (ppm)']
-        gas_data = gas.read_all() # get readings of concentration of all gasses
-        co_Rs = gas_data.reducing / 1000 # convert carbon monoxide gas concentration resistance into kOhm
-        if self.co_R0 != None: # if user has calculated calibration factor for gas readings
-            co = math.pow(10, -1.25 * math.log10(co_Rs/self.co_R0) + 0.64) # convert co reading from kOhm to ppm (Roscoe method)
-        else: 
-            co = co_Rs
-        data = [co]
-        self.save_data(sensor, freq, dur, data, data_heading)
-        return
-    
-    def no2_queue(self, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'no2' method to 'queue' at set intervals to take sensor readings at desired frequency
-        self.queue_op(freq, dur, stime, self.no2) # add 'no2' method to 'queue' at set intervals to take sensor readings at desired frequency
-        time.sleep(dur)
-        self.sensor_status[5] = False # change light sensor status to False (i.e. inactive) as all readings are now complete
-        backlight_on() # turn on LCD backlight
-        display_text('Nitrogen dioxide \nreadings \ncomplete',18) # display sensor reading status on LCD once all readings are complete
-        time.sleep(30)
-        display_text('',1)
-        backlight_off() # turn off LCD backlight
-        return 
+    def save_channel(self, channel, raw, timestamp=None, interval=None): # convert raw reading from 'channel' into final units and save to CSV file
+        freq, dur = self.settings_for(channel.number)
+        data = channel.convert(self, raw)
+        self.save_data(channel.name, freq, dur, data, channel.headings, timestamp, interval)
 
-    def no2(self): # measures concentration of nitrogen dioxide (oxidising) gas
-        gas_data = gas.read_all() # take initial reading to stabalise sensor
-        time.sleep(2) 
-        sensor = 'no2'
-        freq = list(filter(lambda x: x[0] == 6, self.sensors))[0][1] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for no2 sensor (sensor number 6)
-        dur = list(filter(lambda x: x[0] == 6, self.sensors))[0][2] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for no2 sensor (sensor number 6)
-        data_heading = ['Nitrogen dioxide (ppm)']
-        gas_data = gas.read_all() # get readings of concentration of all gasses
-        no2_Rs = gas_data.oxidising / 1000 # convert nitrogen dioxide gas concentration into kOhm
-        if self.no2_R0 != None: # if user has calculated calibration factor for gas readings
-            no2 = math.pow(10, math.log10(no2_Rs/self.no2_R0) - 0.8129) # convert no2 reading from kOhm to ppm (Roscoe method)
-        else: 
-            no2 = no2_Rs
-        data = [no2]
-        self.save_data(sensor, freq, dur, data, data_heading)
-        return
-    
-    def nh3_queue(self, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'nh3' method to 'queue' at set intervals to take sensor readings at desired frequency
-        self.queue_op(freq, dur, stime, self.nh3) # add 'nh3' method to 'queue' at set intervals to take sensor readings at desired frequency
-        time.sleep(dur)
-        self.sensor_status[6] = False # change nh3 sensor status to False (i.e. inactive) as all readings are now complete
-        backlight_on() # turn on LCD backlight
-        display_text('Ammonia \nreadings \ncomplete',20) # display sensor reading status on LCD once all readings are complete
-        time.sleep(30)
-        display_text('',1)
-        backlight_off() # turn off LCD backlight
-        return 
-        
-    def nh3(self): # measures concentration of ammonia gas
-        gas_data = gas.read_all() # take initial reading to stabalise sensor
-        time.sleep(2) 
-        sensor = 'nh3'
-        freq = list(filter(lambda x: x[0] == 7, self.sensors))[0][1] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for nh3 sensor (sensor number 7)
-        dur = list(filter(lambda x: x[0] == 7, self.sensors))[0][2] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for nh3 sensor (sensor number 7)
-        data_heading = ['Ammonia (ppm)']
-        gas_data = gas.read_all() # get readings of concentration of all gasses
-        nh3_Rs = gas_data.nh3 / 1000 # convert ammonia gas concentration resistance into kOhm
-        if self.nh3_R0 != None: # if user has calculated calibration factor for gas readings
-            nh3 = math.pow(10, -1.8 * math.log10(nh3_Rs/self.nh3_R0) - 0.163) # convert nh2 reading from kOhm to ppm (Roscoe method)
-        else: 
-            nh3 = nh3_Rs
-        data = [nh3]
-        self.save_data(sensor, freq, dur, data, data_heading)
-        return
+    def read_channels(self, channels, deadlines=None): # take and save one reading from each channel in 'channels', reading channels which share a device together so each device is only stabalised once ('deadlines' is the time by which each reading should start, by channel name)
+        by_device = {}
+        for channel in channels:
+            by_device.setdefault(channel.device, []).append(channel)
+        for device, device_channels in by_device.items():
+            if deadlines is not None: # record readings delayed past their deadline (e.g. by a PMS5003 timeout earlier in this batch)
+                for channel in device_channels:
+                    self.queue.started(deadlines[channel.name])
+            for channel, raw, error in take_readings(device_channels, devices[device]):
+                if error is None:
+                    self.save_channel(channel, raw)
+                else:
+                    display_text(f'Failed to read \n{device.upper()}',22) # display error message on LCD screen (e.g. PMS5003 timeout)
 
-    def pm_queue(self, freq, dur, stime): # calls 'queue_op' method with appropriate parameters to add 'pm' method to 'queue' at set intervals to take sensor readings at desired frequency
-        self.queue_op(freq, dur, stime, self.pm) # add 'pm' method to 'queue' at set intervals to take sensor readings at desired frequency
-        time.sleep(dur)
-        self.sensor_status[7] = False # change pm sensor status to False (i.e. inactive) as all readings are now complete
-        backlight_on() # turn on LCD backlight
-        display_text('Particulate matter \nreadings \ncomplete',17) # display sensor reading status on LCD once all readings are complete
-        time.sleep(30)
-        display_text('',1)
-        backlight_off() # turn off LCD backlight
-        return 
+    def current_interval(self, sensor, freq): # delay before next reading of 'sensor' - 'freq' unless sensor is adaptive
+        if sensor in self.adaptive:
+            return self.adaptive[sensor].interval
+        return freq
 
-    def pm(self): # measures concentration of PM1.0, PM2.5 and PM10 particulate matter
-        try:
-            data = pms5003.read() # take initial reading to stabalise sensor
-        except pmsReadTimeoutError:
-            pass
-        time.sleep(2) 
-        sensor = 'pm'
-        freq = list(filter(lambda x: x[0] == 8, self.sensors))[0][1] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for pm sensor (sensor number 8)
-        dur = list(filter(lambda x: x[0] == 8, self.sensors))[0][2] # lambda function filters list 'self.sensors' (which stores active sensors, delay between sensor readings and sensor reading duration in tuple format: (active sensor number, delay between sensor readings, sensor reading duration)) to access reading frequency for pm sensor (sensor number 8)
-        data_heading = ['PM1.0 (ug/m3)','PM2.5 (ug/m3)', 'PM10 (ug/m3)']
-        try:
-            data = pms5003.read() # get readings of concentration of PM1.0, PM2.5 and PM10 particulate matter
-        except pmsReadTimeoutError:
-            display_text('Failed to read \nPMS5003',22) # display error message on LCD screen
-            pass
+    def save_data(self, sensor, freq, dur, data, data_heading, timestamp=None, interval=None): # save sensor data to CSV file or database ('timestamp' is the time the reading was taken and 'interval' the delay after which it was taken, if known)
+        if not self.storage.has_space(): # if SD card or storage quota is full, skip reading rather than crash
+            if not self.storage_full:
+                self.storage_full = True
+                display_text('Storage full!\nReadings paused', 18) # display error message on LCD screen
+            return
+        self.storage_full = False
+        flag = []
+        if sensor in self.filters: # filter readings and flag suspect readings (e.g. ADC spikes) once, before they are saved
+            data, flagged = self.filters[sensor].apply(data)
+            flag = [1 if flagged else 0] # 1 = suspect reading
+        data = [round(i, 3) for i in data] # round data values to 3 dp - must iterate over each element in list as data values stored in list
+        now = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now() # get date and time of reading
+        if interval is None:
+            interval = self.interval_used.get(sensor, freq)
+        interval = round(interval, 1)
+        if sensor in self.adaptive: # delay between readings varies between min and max delay
+            freq = f'{self.adaptive[sensor].min_interval}-{self.adaptive[sensor].max_interval} (adaptive)'
+        if self.database is not None: # reading is written to database in the next batch
+            self.database.add(self.date+'-'+self.time, sensor, freq, dur, data_heading, now.timestamp(), interval, flag[0] if flag else None, data)
         else:
-            pm1 = float(data.pm_ug_per_m3(1.0)) # get readings of concentration of PM1.0
-            pm25 = float(data.pm_ug_per_m3(2.5)) # get readings of concentration of PM2.5
-            pm10 = float(data.pm_ug_per_m3(10)) # get readings of concentration of PM10
-            data = [pm1,pm25,pm10]
-            self.save_data(sensor, freq, dur, data, data_heading)
+            self.save_csv(sensor, freq, dur, data, data_heading, now, flag, interval)
+        if self.publisher is not None: # reading is published in the next batch
+            self.publisher.add(sensor, now.timestamp(), data, flag[0] if flag else None)
+        if self.dashboard is not None: # reading is shown on LCD in the next frame
+            self.dashboard.update(sensor, data)
+        if sensor in self.adaptive: # update delay before next reading based on how quickly readings are changing
+            new_interval = self.adaptive[sensor].update(now.timestamp(), data)
+            if self.shared_intervals is not None:
+                self.shared_intervals[channel_by_name(sensor).number] = new_interval # pass new delay to acquisition process
+            else:
+                self.reschedule(sensor, new_interval)
         return
 
-    def save_data(self, sensor, freq, dur, data, data_heading): # save sensor data to CSV file
-        data = [round(i, 3) for i in data] # round data values to 3 dp - must iterate over each element in list as data values stored in list
+    def reschedule(self, sensor, interval): # change the delay before the next reading of adaptive 'sensor' is queued, so a spike is followed by a quicker reading straight away (not one reading later)
+        with self.timers_lock:
+            if sensor not in self.timers:
+                return
+            timer, queued_time, old_interval, args = self.timers[sensor]
+            if interval == old_interval:
+                return
+            timer.cancel()
+            new_timer = threading.Timer(max(0, queued_time + interval - time.time()), self.queue_op, args + [interval]) # delay counted from when the latest reading was queued
+            self.timers[sensor] = (new_timer, queued_time, interval, args)
+            new_timer.start()
+
+    def save_csv(self, sensor, freq, dur, data, data_heading, now, flag, interval): # append reading to sensor's CSV file
         filename = sensor+'-'+self.date+'-'+self.time+'.csv' # filename stores sensor type and current date
-        if os.path.isfile(f'/home/ecoswell/RaspberryPi-Sensor/data/{filename}'): # if CSV file storing data for 'sensor' already exists
-            f = open(f'/home/ecoswell/RaspberryPi-Sensor/data/{filename}', 'a') # create/open CSV file to store data for 'sensor'
-            writer = csv.writer(f)
-        else: # if CSV file storing data for 'sensor' has just been created
-            f = open(f'/home/ecoswell/RaspberryPi-Sensor/data/{filename}', 'w') # create/open CSV file to store data for 'sensor'
-            writer = csv.writer(f)
-            heading = ['Date', 'Time'] + data_heading # enables unlimited number of data headings as 'data_heading' stores an array of each data heading (applicable as pm sensor takes three readings (PM1.0, PM2.5 and PM10), whereas all other sensor only take one reading)
-            writer.writerow(['Time between readings(sec): ',freq]) # record delay between sensor readings
-            writer.writerow(['Duration of readings (mins): ', dur]) # record duration of sensor readings
-            writer.writerow(heading) # write headings to file
-        now = datetime.now() # get current date and time
-        date = now.strftime("%d.%m.%Y") # get current date in correct format
-        time = now.strftime("%H:%M:%S") # get current time in correct format
-        row = [date, time] + data # enables unlimited number of data readings to be stored as 'data' stores an array of each data reading (applicable as pm sensor takes three readings (PM1.0, PM2.5 and PM10), whereas all other sensor only take one reading)
-        writer.writerow(row) # write current date, current time, data reading to file
-        f.close() # close file
-        return
+        filepath = self.storage.active_file(filename) # path to current segment of data file (full segments are sealed and compressed)
+        f = None
+        try:
+            if os.path.isfile(filepath): # if CSV file storing data for 'sensor' already exists
+                f = open(filepath, 'a') # create/open CSV file to store data for 'sensor'
+                writer = csv.writer(f)
+            else: # if CSV file storing data for 'sensor' has just been created
+                f = open(filepath, 'w') # create/open CSV file to store data for 'sensor'
+                writer = csv.writer(f)
+                heading = ['Date', 'Time'] + data_heading + (['Flag'] if flag else []) + ['Interval (sec)'] # enables unlimited number of data headings as 'data_heading' stores an array of each data heading (applicable as pm sensor takes three readings (PM1.0, PM2.5 and PM10), whereas all other sensor only take one reading)
+                writer.writerow(['Time between readings(sec): ',freq]) # record delay between sensor readings
+                writer.writerow(['Duration of readings (mins): ', dur]) # record duration of sensor readings
+                writer.writerow(heading) # write headings to file
+            date = now.strftime("%d.%m.%Y") # get current date in correct format
+            time = now.strftime("%H:%M:%S") # get current time in correct format
+            row = [date, time] + data + flag + [interval] # enables unlimited number of data readings to be stored as 'data' stores an array of each data reading (applicable as pm sensor takes three readings (PM1.0, PM2.5 and PM10), whereas all other sensor only take one reading)
+            writer.writerow(row) # write current date, current time, data reading to file
+            f.close() # close file
+        except OSError: # SD card full or write failed - recheck storage space before next reading
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+            self.storage.get_headroom(refresh=True)
 
     def save_data_final(self): # move data file to folder storing complete data files
-        directory = '/home/ecoswell/RaspberryPi-Sensor/data'
-        new_directory = '/home/ecoswell/RaspberryPi-Sensor/data_final'
+        if self.publisher is not None: # publish remaining readings (or save them to be published next time)
+            self.publisher.stop()
+        if self.database is not None: # export CSV files for this session (and any earlier session which was cut short) from database
+            try:
+                self.database.export_unexported(DATA_DIR)
+            except (sqlite3.Error, OSError): # readings remain in the database and can be exported later by running 'sqlite_storage.py'
+                display_text('Database error!\nCSV export failed', 16) # display error message on LCD screen
+            self.database.close() # a new database connection is opened for each session
+        self.storage.wait_compression() # finish compressing sealed segments before they are moved
+        directory = DATA_DIR
+        new_directory = FINAL_DIR
         for file in os.listdir(directory):
             filename = os.path.join(directory, file)
             new_filename = os.path.join(new_directory, file)
             os.rename(filename, new_filename)
         
-    def queue_op(self, freq, dur, stime, sensor_method): # general operation for sensor queue - adds sensor execution method to 'self.queue' every 'freq' seconds to take sensor readings at desired intervals to take sensor readings for 'dur' secs, whilst avoiding collisions which may occur if multiple sensors take readings simultaneously 
+    def queue_op(self, freq, dur, stime, channel, interval=None): # general operation for sensor queue - adds channel to 'self.queue' every 'freq' seconds (or adaptive delay) to take sensor readings at desired intervals to take sensor readings for 'dur' secs, whilst avoiding collisions which may occur if multiple sensors take readings simultaneously 
         if time.time() - stime >= dur: # if duration for which sensor readings should be taken (as defined by the user in 'sensor_settings.py') has been reached, terminate execution of sensor readings
             return
         else:
-            threading.Timer(freq, self.queue_op, [freq, dur, stime, sensor_method]).start() # recursively call 'queue_op' method at frequency specified by 'freq' to add sensor method to 'queue' (which executes sensor readings such that collisions are avoided) at desired frequency and pass required arguments in list
-            self.queue.append(sensor_method) # add sensor method to 'self.queue' to schedule execution of sensor reading
+            sensor = channel.name
+            next_interval = self.current_interval(sensor, freq) # delay before next reading
+            timer = threading.Timer(next_interval, self.queue_op, [freq, dur, stime, channel, next_interval]) # recursively call 'queue_op' method at frequency specified by 'freq' to add sensor method to 'queue' (which executes sensor readings such that collisions are avoided) at desired frequency and pass required arguments in list
+            if sensor in self.adaptive: # timer is re-armed by 'reschedule' once this reading has been saved and the delay updated
+                with self.timers_lock:
+                    if sensor in self.timers and self.timers[sensor][0] is not threading.current_thread(): # this timer fired just as it was replaced by 'reschedule'
+                        return
+                    self.timers[sensor] = (timer, time.time(), next_interval, [freq, dur, stime, channel])
+            timer.start()
+            self.interval_used[sensor] = interval if interval is not None else next_interval # record delay after which this reading was queued
+            self.queue.put(sensor, channel, time.time() + next_interval) # add channel to 'self.queue' to schedule execution of sensor reading - reading must be taken before the next reading of the sensor is due
             
     def dequeue(self): # remove each queued sensor reading from the queue and execute the sensor reading, avoiding multiple sensors taking readings simultaneously  
         while True:
-            if len(self.queue) >= 1: # if there are sensors readings to be taken
-                self.queue.pop(0)() # execute reading for front sensor in queue and remove sensor from queue
+            queued = self.queue.get_all(timeout=1) # remove all queued channels and their deadlines from queue, earliest deadline first (waits up to 1 sec for a channel to be queued)
+            if queued: # if there are sensors readings to be taken
+                self.read_channels([channel for channel, deadline in queued], {channel.name: deadline for channel, deadline in queued}) # execute readings for queued channels
                 time.sleep(2) # 2 second delay between each sensor reading
-            elif True not in self.sensor_status: # if all sensors are inactive
+            elif True not in self.sensor_status.values(): # if all sensors are inactive
                 time.sleep(5)
+                if self.dashboard is not None:
+                    self.dashboard.stop()
                 display_text('All readings \nnow complete.\nYou can safely unplug \n the sensor now.',15) # display sensor reading status on LCD screen
                 self.save_data_final() # move data file to folder storing complete data files
+                self.save_queue_stats()
                 break # all readings are complete, so terminate
-            time.sleep(1)
+
+    def save_queue_stats(self, groups=None): # record how often readings could not be taken on time (e.g. PMS5003 timeouts) to help choose reading frequencies, or readings lost by acquisition processes ('groups')
+        stats = self.queue.stats()
+        try:
+            with open('/home/ecoswell/RaspberryPi-Sensor/code/queue_stats.txt', 'w') as f:
+                if groups is None:
+                    f.write(f'Readings merged with a reading still waiting to be taken: {stats["coalesced"]}\n')
+                    f.write(f'Readings taken after the next reading was due: {stats["overruns"]}\n')
+                    f.write(f'Readings dropped as queue was full: {stats["dropped"]}\n')
+                    return
+                for group in groups:
+                    f.write(f'Readings dropped by {group.group} acquisition process as buffer was full: {group.ring.dropped()}\n')
+                    if group.stalled:
+                        f.write(f'{group.group} acquisition process was stopped as it did not finish in time (stalled)\n')
+                    elif group.failed():
+                        f.write(f'{group.group} acquisition process stopped with an error (exit code {group.process.exitcode})\n')
+        except OSError:
+            pass
+
+    def save_reading(self, sensor_num, timestamp, status, interval, values): # convert raw reading from an acquisition process into final units and save to CSV file
+        channel = CHANNELS[sensor_num]
+        if status == STATUS_FAILED:
+            display_text(f'Failed to read \n{channel.device.upper()}',22) # display error message on LCD screen
+            return
+        self.save_channel(channel, values, timestamp, interval)
+
+    def consume(self, groups): # save readings from acquisition processes' ring buffers until all acquisition processes have finished
+        stopped = [] # acquisition processes which have stopped with an error
+        while True:
+            for group in groups:
+                if group.overdue(): # process has stalled (e.g. in a driver call) - stop it so readings can be completed
+                    group.terminate()
+            finished = not any(group.is_alive() for group in groups) # check before emptying buffers so no readings are missed
+            readings = []
+            for group in groups:
+                readings += group.ring.get_all()
+            readings.sort(key=lambda reading: reading[1]) # save readings in the order they were taken
+            for reading in readings:
+                self.save_reading(*reading)
+            for group in groups:
+                if group.failed() and group not in stopped: # readings from this group's sensors have stopped
+                    stopped.append(group)
+                    display_text(f'{group.group.upper()} sensors\nstopped!', 20) # display error message on LCD screen
+            if finished:
+                break
+            time.sleep(0.2)
+        self.save_queue_stats(groups)
+        for group in groups:
+            group.close()
+        time.sleep(5)
+        if self.dashboard is not None:
+            self.dashboard.stop()
+        display_text('All readings \nnow complete.\nYou can safely unplug \n the sensor now.',15) # display sensor reading status on LCD screen
+        self.save_data_final() # move data file to folder storing complete data files
+
+    def acquisition_main(self): # take readings for each group of devices in its own process
+        sensors = [(sensor[0], sensor[1], sensor[2]*60) for sensor in self.sensors] # convert durations from minutes to seconds
+        self.shared_intervals = multiprocessing.Array('d', [0.0] + [self.current_interval(CHANNELS[num].name, 0) if num in CHANNELS else 0.0 for num in range(1, max(CHANNELS) + 1)], lock=False) # delay between readings of adaptive sensors (0 = use 'freq'), by sensor number
+        groups = split_groups(sensors, self.acquisition_buffer_size, self.shared_intervals)
+        for group in groups:
+            group.start()
+        consume_thread = threading.Thread(target=self.consume, args=(groups,)) # save readings in background thread
+        consume_thread.start()
+        if self.dashboard is not None:
+            self.dashboard.start()
 
     def main(self): # control operation of active sensors
         if self.calculate_temp_factor == True and self.calculate_gas_factor == False: # if user wishes to calculate the temperature compensation factor
@@ -379,15 +402,19 @@ class SensorReadings(): # class containing methods to take sensor readings
             self.gas_factor()
         elif self.calculate_gas_factor == True and self.calculate_temp_factor == True: # if user has accidently set both 'calculate_gas_factor' and 'calculate_temp_factor' to True 
             display_text('Error!\nCannot calculate temp\nand gas factor.',15)
+        elif self.acquisition_processes == True: # if user wishes to read each group of devices in its own process
+            self.acquisition_main()
         else:
             for sensor in self.sensors: # iterate through active sensors as defined by user in 'sensor_settings.py'
                 sensor_num, sensor_freq, sensor_dur = sensor[0], sensor[1], sensor[2]*60 # first element in tuple stores sensor number, second element stores reading frequency for sensor, third element stores duration of sensor recordings (in minutes)
-                self.sensor_status[sensor_num-1] = True # change sensor status to True (i.e. active) for each sensor which user has defined to be active in 'sensor_settings.py'
-                sensor_method = self.sensors_dict[sensor_num] # lookup sensor method that is associated with the sensor number ('sensor_num') using 'sensors_dict'
-                sensor_thread = threading.Thread(target=sensor_method, args = (sensor_freq, sensor_dur, time.time())) # run sensor queue methods (e.g. 'temp_queue') in background thread
+                self.sensor_status[sensor_num] = True # change sensor status to True (i.e. active) for each sensor which user has defined to be active in 'sensor_settings.py'
+                channel = CHANNELS[sensor_num] # lookup channel that is associated with the sensor number ('sensor_num') in 'sensor_registry.py'
+                sensor_thread = threading.Thread(target=self.channel_queue, args = (channel, sensor_freq, sensor_dur, time.time())) # run sensor queue in background thread
                 sensor_thread.start()
             queue_thread = threading.Thread(target=self.dequeue) # run queue in background thread
             queue_thread.start()
+            if self.dashboard is not None:
+                self.dashboard.start()
 
 
 
@@ -0,0 +1,146 @@
+'''
+Registry of the sensor devices and the channels (data types) read from them - to add a new sensor, add its device to 'DEVICES'
+and a 'Channel' to 'CHANNELS', and the sampling engine in 'sensor_readings.py' will schedule, read, convert and save it
+'''
+
+import time
+
+
+class Device(): # a sensor board and the bus it is connected to
+    def __init__(self, bus, init):
+        self.bus = bus # devices on the same bus are read by the same acquisition process ('acquisition_processes' in 'sensor_settings.py')
+        self.init = init # function which initialises and returns the device
+
+
+class Channel(): # one data type read from a device
+    def __init__(self, number, name, device, read, convert, headings, complete_text, font_size, warm_up=2, display_value=0):
+        self.number = number # sensor number used in 'sensor_settings.py'
+        self.name = name # name used in data file names (e.g. 'temp')
+        self.device = device # name of device in 'DEVICES' which the channel is read from
+        self.read = read # function which takes raw reading from the device
+        self.convert = convert # function which converts raw reading into final units (passed the 'SensorReadings' instance for calibration factors)
+        self.headings = headings # data headings in data file
+        self.complete_text = complete_text # message displayed on LCD once all readings are complete
+        self.font_size = font_size # font size of 'complete_text'
+        self.warm_up = warm_up # delay between initial reading to stabalise sensor and actual reading (secs)
+        self.display_value = display_value # index in 'headings' of the value shown on the LCD dashboard
+
+
+def get_cpu_temperature(): # get the temperature of the CPU for compensation
+    with open("/sys/class/thermal/thermal_zone0/temp", "r") as f:
+        temp = f.read()
+        temp = int(temp) / 1000.0
+    return temp
+
+
+# device initialisation - drivers are imported here so they are only loaded by the process which uses the device:
+def init_bme280():
+    from bme280 import BME280
+    return BME280() # initialise BME280 temperature/pressure/humidity sensor
+
+def init_ltr559():
+    try:
+        # transitional fix for breaking change in LTR559
+        from ltr559 import LTR559
+        return LTR559() # initialise LTR559 light/proximity sensor
+    except ImportError:
+        import ltr559
+        return ltr559
+
+def init_gas():
+    from enviroplus import gas
+    return gas # MICS6814 gas sensor read through ADS1015 analog to digital converter
+
+def init_pms5003():
+    from pms5003 import PMS5003
+    return PMS5003() # intitialise PMS5003 particulate sensor
+
+
+# raw readings:
+def read_temp(bme280): # raw temp and CPU temp (so temp can be compensated for CPU heating)
+    return [bme280.get_temperature(), get_cpu_temperature()]
+
+def read_pressure(bme280):
+    return [bme280.get_pressure()]
+
+def read_humidity(bme280):
+    return [bme280.get_humidity()]
+
+def read_light(ltr559): # light intensity and proximity (so a covered sensor can be detected)
+    return [ltr559.get_lux(), ltr559.get_proximity()]
+
+def read_co(gas):
+    return [gas.read_all().reducing / 1000] # carbon monoxide gas concentration resistance in kOhm
+
+def read_no2(gas):
+    return [gas.read_all().oxidising / 1000] # nitrogen dioxide gas concentration resistance in kOhm
+
+def read_nh3(gas):
+    return [gas.read_all().nh3 / 1000] # ammonia gas concentration resistance in kOhm
+
+def read_pm(pms5003): # concentration of PM1.0, PM2.5 and PM10 particulate matter
+    data = pms5003.read()
+    return [float(data.pm_ug_per_m3(1.0)), float(data.pm_ug_per_m3(2.5)), float(data.pm_ug_per_m3(10))]
+
+
+# conversions into final units:
+def convert_temp(readings, raw):
+    return [readings.compensate_temp(raw[0], raw[1])]
+
+def convert_none(readings, raw):
+    return list(raw)
+
+def convert_light(readings, raw):
+    if raw[1] < 10: # no object near the sensor (small values of proximity indicate greater proximity)
+        return [raw[0]]
+    return [1] # larger value of proximity --> closer proximity --> object near the sensor --> cannot take reading of light intensity (dark)
+
+def convert_co(readings, raw):
+    return [readings.co_ppm(raw[0])]
+
+def convert_no2(readings, raw):
+    return [readings.no2_ppm(raw[0])]
+
+def convert_nh3(readings, raw):
+    return [readings.nh3_ppm(raw[0])]
+
+
+DEVICES = {
+    'bme280': Device('i2c', init_bme280),
+    'ltr559': Device('i2c', init_ltr559),
+    'gas': Device('i2c', init_gas),
+    'pms5003': Device('serial', init_pms5003),
+    }
+
+CHANNELS = {
+    1: Channel(1, 'temp', 'bme280', read_temp, convert_temp, ['Temperature (*C)'], 'Temperature\n readings\n complete', 20),
+    2: Channel(2, 'pressure', 'bme280', read_pressure, convert_none, ['Pressure (hPa)'], 'Pressure\nreadings\ncomplete', 20),
+    3: Channel(3, 'humidity', 'bme280', read_humidity, convert_none, ['Humidity (%)'], 'Humidity\nreadings\ncomplete', 20),
+    4: Channel(4, 'light', 'ltr559', read_light, convert_light, ['Light (lux)'], 'Light \nreadings \ncomplete', 20),
+    5: Channel(5, 'co', 'gas', read_co, convert_co, ['Carbon monoxide (ppm)'], 'Carbon monoxide\nreadings \ncomplete', 18),
+    6: Channel(6, 'no2', 'gas', read_no2, convert_no2, ['Nitrogen dioxide (ppm)'], 'Nitrogen dioxide \nreadings \ncomplete', 18),
+    7: Channel(7, 'nh3', 'gas', read_nh3, convert_nh3, ['Ammonia (ppm)'], 'Ammonia \nreadings \ncomplete', 20),
+    8: Channel(8, 'pm', 'pms5003', read_pm, convert_none, ['PM1.0 (ug/m3)','PM2.5 (ug/m3)', 'PM10 (ug/m3)'], 'Particulate matter \nreadings \ncomplete', 17, display_value=1), # dashboard shows PM2.5
+    }
+
+
+def channel_by_name(name): # look up channel from its name (e.g. 'temp')
+    for channel in CHANNELS.values():
+        if channel.name == name:
+            return channel
+    return None
+
+
+def take_readings(channels, device): # take one reading from each channel in 'channels' (all read from 'device'), stabalising the device once - returns (channel, raw reading or None, error or None) for each channel
+    try:
+        channels[0].read(device) # take initial reading to stabalise sensor
+    except Exception:
+        pass
+    time.sleep(max(channel.warm_up for channel in channels))
+    results = []
+    for channel in channels:
+        try:
+            results.append((channel, channel.read(device), None))
+        except Exception as error: # e.g. PMS5003 read timeout - other channels are still read
+            results.append((channel, None, error))
+    return results
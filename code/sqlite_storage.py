@@ -0,0 +1,167 @@
+'''
+Store sensor readings in an SQLite database (one database per Raspberry Pi) instead of one CSV file per sensor per session -
+readings are written in batches every few seconds, and CSV files are exported from the database when readings are complete
+
+Run this file directly to export a session's CSV files on demand:
+python3 sqlite_storage.py [session, e.g. '16.09.2022-12:58:00'] (exports the latest session if no session is given)
+'''
+
+import sys
+path = '/home/ecoswell/RaspberryPi-Sensor' # path to folder storing 'sensor_settings' module
+sys.path.append(path) # enable importing module ('sensor_settings') from outside directory
+import os
+import csv
+import re
+import time
+import socket
+import sqlite3
+import threading
+from datetime import datetime
+from storage_manager import DB_DIR
+
+MAX_VALUES = 3 # maximum number of values in one reading (pm sensor records PM1.0, PM2.5 and PM10)
+MAX_PENDING = 1000 # readings waiting to be written which trigger a write before the flush interval has elapsed
+MAX_RETAINED = 20000 # readings kept in memory while the database cannot be written to (oldest are discarded beyond this)
+
+
+class SQLiteStorage(): # class containing methods to store readings in and export readings from the SQLite database
+    def __init__(self, flush_interval):
+        os.makedirs(DB_DIR, exist_ok=True)
+        self.path = os.path.join(DB_DIR, socket.gethostname() + '.db') # one database per Raspberry Pi
+        self.flush_interval = flush_interval # seconds between writing pending readings to the database
+        self.pending = [] # readings waiting to be written to the database
+        self.pending_lock = threading.Lock() # protects 'pending', which is added to by the thread taking readings
+        self.db_lock = threading.Lock() # prevents two threads using the database connection simultaneously
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute('PRAGMA auto_vacuum=INCREMENTAL') # space freed by 'prune_sessions' can be returned to the SD card (must be set before the database is first written)
+        self.connection.execute('PRAGMA journal_mode=WAL') # write-ahead log - readers are not blocked by writes and a crash cannot corrupt the database
+        self.connection.execute('PRAGMA synchronous=NORMAL') # only sync to SD card at checkpoints rather than on every transaction
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS sessions (session TEXT, channel TEXT, freq TEXT, dur NUMERIC, headings TEXT, exported INTEGER DEFAULT 0, PRIMARY KEY (session, channel))') # settings and data headings of each sensor in each session (to export CSV files), and whether its CSV file has been exported
+            if 'exported' not in [column[1] for column in self.connection.execute('PRAGMA table_info(sessions)')]: # database created before sessions were marked as exported
+                self.connection.execute('ALTER TABLE sessions ADD COLUMN exported INTEGER DEFAULT 0')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS readings (session TEXT, channel TEXT, ts REAL, interval NUMERIC, flag INTEGER, value1 REAL, value2 REAL, value3 REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS readings_channel_ts ON readings (channel, ts)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS readings_session ON readings (session)')
+        self.known_channels = set() # (session, channel) pairs already recorded in 'sessions' table
+        self.stopped = threading.Event() # set by 'close' to stop the flush thread
+        self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True) # daemon thread so it does not count as an active sensor reading
+        self.flush_thread.start()
+
+    def add(self, session, channel, freq, dur, headings, timestamp, interval, flag, data): # queue reading to be written in the next batch
+        values = list(data) + [None] * (MAX_VALUES - len(data))
+        with self.pending_lock:
+            if (session, channel) not in self.known_channels:
+                self.known_channels.add((session, channel))
+                self.pending.append(('session', (session, channel, str(freq), dur, ','.join(headings))))
+            self.pending.append(('reading', (session, channel, timestamp, interval, flag, *values)))
+            full = len(self.pending) % MAX_PENDING == 0 # write every 'MAX_PENDING' readings (retried every 'MAX_PENDING' readings if writing fails)
+        if full:
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass # readings are kept and written in the next batch
+
+    def flush(self): # write all pending readings to the database in a single transaction
+        with self.pending_lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return
+        try:
+            with self.db_lock:
+                with self.connection: # commits once for the whole batch (or nothing if writing fails)
+                    self.connection.executemany('INSERT OR IGNORE INTO sessions (session, channel, freq, dur, headings) VALUES (?, ?, ?, ?, ?)', [row for kind, row in pending if kind == 'session'])
+                    self.connection.executemany('INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [row for kind, row in pending if kind == 'reading'])
+        except sqlite3.Error: # e.g. SD card full - put batch back so it is written once the database can be written to again
+            with self.pending_lock:
+                self.pending = pending + self.pending
+                excess = len(self.pending) - MAX_RETAINED
+                if excess > 0: # discard oldest readings, but never the session rows needed to export CSV files
+                    kept = []
+                    for kind, row in self.pending:
+                        if kind == 'reading' and excess > 0:
+                            excess -= 1
+                        else:
+                            kept.append((kind, row))
+                    self.pending = kept
+            raise
+
+    def flush_loop(self): # write pending readings every 'flush_interval' seconds
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass # e.g. SD card full - readings are kept and written in the next batch (up to 'MAX_RETAINED')
+
+    def close(self): # stop the flush thread, write any remaining readings and close the database once readings are complete
+        self.stopped.set()
+        self.flush_thread.join()
+        try:
+            self.flush()
+        except sqlite3.Error: # remaining readings cannot be written - they are lost
+            pass
+        with self.db_lock:
+            self.connection.close()
+
+    def latest_session(self):
+        with self.db_lock:
+            row = self.connection.execute('SELECT session FROM readings ORDER BY ts DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def export_session(self, session, directory): # write one CSV file for each sensor in 'session' to 'directory' (same format as 'save_data' in 'sensor_readings.py')
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass # export readings which have already been written
+        with self.db_lock:
+            channels = self.connection.execute('SELECT channel, freq, dur, headings FROM sessions WHERE session = ?', (session,)).fetchall()
+            for channel, freq, dur, headings in channels:
+                headings = headings.split(',')
+                rows = self.connection.execute('SELECT ts, interval, flag, value1, value2, value3 FROM readings WHERE session = ? AND channel = ? ORDER BY ts', (session, channel)).fetchall()
+                has_flag = any(row[2] is not None for row in rows) # sensor readings were filtered
+                with open(os.path.join(directory, channel+'-'+session+'.csv'), 'w') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['Time between readings(sec): ', freq]) # record delay between sensor readings
+                    writer.writerow(['Duration of readings (mins): ', dur]) # record duration of sensor readings
+                    writer.writerow(['Date', 'Time'] + headings + (['Flag'] if has_flag else []) + ['Interval (sec)'])
+                    for ts, interval, flag, *values in rows:
+                        now = datetime.fromtimestamp(ts)
+                        writer.writerow([now.strftime("%d.%m.%Y"), now.strftime("%H:%M:%S")] + values[:len(headings)] + ([flag] if has_flag else []) + [interval])
+            with self.connection:
+                self.connection.execute('UPDATE sessions SET exported = 1 WHERE session = ?', (session,))
+
+    def export_unexported(self, directory): # export every session which has not been exported yet, including sessions cut short by a power cut or reboot - returns sessions exported
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass # export readings which have already been written
+        with self.db_lock:
+            sessions = [row[0] for row in self.connection.execute('SELECT DISTINCT session FROM sessions WHERE exported = 0')]
+        for session in sessions:
+            self.export_session(session, directory)
+        return sessions
+
+    def prune_sessions(self, sessions): # remove readings of 'sessions' (once their CSV files have been emailed) so the database stays within the storage quota
+        sessions = [(session,) for session in sessions]
+        if not sessions:
+            return
+        with self.db_lock:
+            with self.connection:
+                self.connection.executemany('DELETE FROM readings WHERE session = ?', sessions)
+                self.connection.executemany('DELETE FROM sessions WHERE session = ?', sessions)
+            self.connection.executescript('PRAGMA incremental_vacuum;') # shrink database file ('executescript' runs the pragma to completion - 'execute' only frees one page)
+            self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)') # shrink write-ahead log
+
+
+def session_of(filename): # session of a CSV file exported by 'export_session' (e.g. 'temp-16.09.2022-12:58:00.csv' --> '16.09.2022-12:58:00')
+    match = re.match(r'[^-]+-(.+?)(\.part\d+)?\.csv', os.path.basename(filename))
+    return match.group(1) if match else None
+
+
+if __name__ == '__main__':
+    from storage_manager import FINAL_DIR
+    database = SQLiteStorage(flush_interval=60)
+    session = sys.argv[1] if len(sys.argv) > 1 else database.latest_session()
+    if session is not None:
+        database.export_session(session, FINAL_DIR) # exported files are emailed by 'email_file.py'
+    database.close()
@@ -0,0 +1,126 @@
+'''
+Manage data storage on the Raspberry Pi SD card - rotate data files into fixed-size segments, compress sealed segments
+in the background and keep the data folders within the storage quota set in 'sensor_settings.py'
+'''
+
+import sys
+path = '/home/ecoswell/RaspberryPi-Sensor' # path to folder storing 'sensor_settings' module
+sys.path.append(path) # enable importing module ('sensor_settings') from outside directory
+import sensor_settings
+import os
+import gzip
+import shutil
+import time
+import threading
+import queue
+
+DATA_DIR = '/home/ecoswell/RaspberryPi-Sensor/data' # directory storing data files of the current session
+FINAL_DIR = '/home/ecoswell/RaspberryPi-Sensor/data_final' # directory storing data files ready to be emailed
+EMAILED_DIR = '/home/ecoswell/RaspberryPi-Sensor/data_emailed' # directory storing data files which have already been emailed
+DB_DIR = '/home/ecoswell/RaspberryPi-Sensor/database' # directory storing SQLite database (counts towards the storage quota - sessions are removed from it once emailed)
+PUBLISH_DIR = '/home/ecoswell/RaspberryPi-Sensor/publish_queue' # directory storing readings waiting to be published to the MQTT broker (limited separately by 'publish_queue_mb')
+HEADROOM_CHECK_INTERVAL = 60 # seconds between recalculating free space (avoids scanning the data folders on every reading)
+
+
+class StorageManager(): # class containing methods to manage the data folders on the SD card
+    def __init__(self):
+        self.quota = sensor_settings.storage_quota_mb * 1024 * 1024 # maximum size of all data folders combined (bytes)
+        self.segment_size = sensor_settings.segment_size_kb * 1024 # size at which an active data file is sealed and a new segment started (bytes)
+        self.min_free = sensor_settings.min_free_space_mb * 1024 * 1024 # space which must always be left free on the SD card (bytes)
+        self.lock = threading.Lock() # prevents two threads rotating the same file or recalculating headroom simultaneously
+        self.compress_queue = queue.Queue() # stores sealed segments waiting to be compressed
+        self.compress_thread = None # background thread which compresses sealed segments (started on first use)
+        self.headroom = None # last calculated free space available for data (bytes)
+        self.headroom_time = 0 # time at which 'headroom' was last calculated
+
+    def used_bytes(self): # total size of all files in the data folders
+        total = 0
+        for directory in (DATA_DIR, FINAL_DIR, EMAILED_DIR, DB_DIR, PUBLISH_DIR):
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    def get_headroom(self, refresh=False): # bytes which can still be written before reaching either the quota or the minimum free space on the SD card
+        with self.lock:
+            if refresh or self.headroom is None or time.time() - self.headroom_time >= HEADROOM_CHECK_INTERVAL:
+                quota_left = self.quota - self.used_bytes() # space left within the storage quota
+                disk_left = shutil.disk_usage(DATA_DIR).free - self.min_free # space left on the SD card
+                self.headroom = min(quota_left, disk_left)
+                self.headroom_time = time.time()
+            return self.headroom
+
+    def has_space(self): # whether there is enough headroom to keep saving readings
+        if self.get_headroom() > 0:
+            return True
+        self.enforce_quota() # try to free space by removing data which has already been emailed
+        return self.get_headroom(refresh=True) > 0
+
+    def active_file(self, filename): # return path to write 'filename' to, sealing the current segment first if it has reached the segment size
+        filepath = os.path.join(DATA_DIR, filename)
+        with self.lock:
+            if os.path.isfile(filepath) and os.path.getsize(filepath) >= self.segment_size: # active file is full
+                self.seal(filepath)
+        return filepath
+
+    def seal(self, filepath): # rename full data file to the next free segment number and queue it for compression
+        base, ext = os.path.splitext(filepath)
+        segment = 1
+        while os.path.exists(f'{base}.part{segment}{ext}') or os.path.exists(f'{base}.part{segment}{ext}.gz'):
+            segment += 1
+        sealed = f'{base}.part{segment}{ext}' # e.g. 'temp-16.09.2022-12:58:00.part1.csv'
+        os.rename(filepath, sealed) # next reading creates a new active file with its own headings
+        self.queue_compression(sealed)
+        return sealed
+
+    def queue_compression(self, filepath): # add sealed segment to the background compression queue
+        if self.compress_thread is None or not self.compress_thread.is_alive():
+            self.compress_thread = threading.Thread(target=self.compress_worker, daemon=True) # daemon thread so compression never keeps the Raspberry Pi from shutting down
+            self.compress_thread.start()
+        self.compress_queue.put(filepath)
+
+    def compress_worker(self): # compress queued segments at low CPU priority so sensor readings are not delayed
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19) # lowest priority for this thread only (Linux)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            filepath = self.compress_queue.get()
+            try:
+                self.compress(filepath)
+            except OSError:
+                pass # file was moved or removed before it could be compressed - leave it uncompressed
+            finally:
+                self.compress_queue.task_done()
+
+    def compress(self, filepath): # gzip 'filepath' and remove the uncompressed file
+        tmp = filepath + '.gz.tmp'
+        with open(filepath, 'rb') as f_in, gzip.open(tmp, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.rename(tmp, filepath + '.gz') # rename only once complete so a partially compressed file is never emailed
+        os.remove(filepath)
+
+    def compress_directory(self, directory): # queue every uncompressed data file in 'directory' for compression
+        for file in os.listdir(directory):
+            if file.endswith('.csv'):
+                self.queue_compression(os.path.join(directory, file))
+
+    def wait_compression(self): # block until all queued segments have been compressed
+        self.compress_queue.join()
+
+    def enforce_quota(self): # remove oldest emailed data files until the data folders are within the storage quota
+        with self.lock:
+            used = self.used_bytes()
+            if used <= self.quota or not os.path.isdir(EMAILED_DIR):
+                return
+            emailed = [entry for entry in os.scandir(EMAILED_DIR) if entry.is_file() and not entry.name.endswith('.tmp')] # only data which has already been emailed may be removed
+            emailed.sort(key=lambda entry: entry.stat().st_mtime) # oldest first
+            for entry in emailed:
+                if used <= self.quota:
+                    break
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                used -= size
+            self.headroom = None # force headroom to be recalculated
@@ -0,0 +1,66 @@
+'''
+Queue of sensor readings waiting to be taken - readings are taken in order of deadline (the time by which the reading must be taken,
+before the next reading of the same sensor is due), only one reading of each sensor can be waiting at a time,
+and the queue has a maximum size so that it cannot grow without limit if readings take longer than their intervals
+'''
+
+import time
+import heapq
+import threading
+
+
+class WorkQueue(): # thread-safe bounded priority queue of pending readings, with at most one pending reading per sensor
+    def __init__(self, maxsize, drop_policy='oldest'):
+        self.maxsize = maxsize # maximum number of pending readings
+        self.drop_policy = drop_policy # 'oldest' removes the reading queued first when the queue is full, 'newest' rejects the new reading
+        self.heap = [] # [deadline, sequence number, key] of each pending reading, earliest deadline first (entries for removed readings are skipped)
+        self.pending = {} # sequence number and item of each pending reading (by key, e.g. sensor name)
+        self.sequence = 0 # incremented for each queued reading, so readings with the same deadline are taken in the order they were queued
+        self.condition = threading.Condition() # protects queue and wakes 'get_all' when a reading is queued
+        self.coalesced = 0 # readings which were due while the previous reading of the same sensor was still waiting (merged into one reading)
+        self.overruns = 0 # readings started after their deadline
+        self.dropped = 0 # readings removed or rejected because the queue was full
+
+    def __len__(self):
+        with self.condition:
+            return len(self.pending)
+
+    def put(self, key, item, deadline): # queue 'item' to be taken by 'deadline' - returns whether 'item' is pending
+        with self.condition:
+            if key in self.pending: # reading of the same sensor is already waiting - take one reading instead of two
+                sequence = self.pending[key][0]
+                self.pending[key] = (sequence, item) # keep earlier deadline and position in queue
+                self.coalesced += 1
+                return True
+            if len(self.pending) >= self.maxsize:
+                self.dropped += 1
+                if self.drop_policy == 'newest':
+                    return False
+                oldest = min(self.pending, key=lambda pending_key: self.pending[pending_key][0])
+                del self.pending[oldest] # its heap entry is skipped by 'get_all'
+            self.sequence += 1
+            self.pending[key] = (self.sequence, item)
+            heapq.heappush(self.heap, [deadline, self.sequence, key])
+            self.condition.notify()
+            return True
+
+    def get_all(self, timeout=None): # remove and return all pending (item, deadline) pairs, earliest deadline first - waits up to 'timeout' seconds if the queue is empty
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            items = []
+            while self.heap:
+                deadline, sequence, key = heapq.heappop(self.heap)
+                if key not in self.pending or self.pending[key][0] != sequence: # reading was dropped
+                    continue
+                items.append((self.pending.pop(key)[1], deadline))
+            return items
+
+    def started(self, deadline): # call when a reading removed by 'get_all' is started - counts it as an overrun if it started after its deadline (e.g. delayed by earlier readings in the same batch)
+        if time.time() > deadline:
+            with self.condition:
+                self.overruns += 1
+
+    def stats(self): # counts of coalesced, overrun and dropped readings
+        with self.condition:
+            return {'coalesced': self.coalesced, 'overruns': self.overruns, 'dropped': self.dropped}
@@ -53,6 +53,139 @@ Note: if you want to calculate the gas calibration factor, 'calculate_temp_facto
 '''
 calculate_gas_factor = False
 
+'''
+ADAPTIVE READING FREQUENCY
+
+Sensors listed below take readings more often while their readings change quickly (e.g. a sudden rise in particulate matter)
+and less often while their readings are stable, instead of using the fixed delay between readings set in 'sensors' above.
+Use the format {sensor number: (shortest delay between readings (secs), longest delay between readings (secs), change threshold)}
+The change threshold is in the sensor's units (e.g. ug/m3 for particulate matter) - readings are taken more often when readings
+change by more than the threshold per minute. The delay actually used is recorded next to every reading in the 'Interval (sec)' column.
+i.e. to read particulate matter every 10 to 120 secs, reading more often when PM2.5 changes by more than 5 ug/m3 per minute, write {8: (10, 120, 5)}
+'''
+adaptive_sensors = {}
+
+
+'''
+READING FILTERS
+
+Filters smooth sensor readings and flag suspect readings (e.g. sudden spikes in gas readings or faulty particulate matter readings)
+before they are saved. Suspect readings are still saved, with a 1 in the 'Flag' column (0 = reading is fine).
+Use the format {sensor number: [filter, filter, ...]} - filters are applied in order. Available filters:
+('hampel', window, sigmas) - flags readings more than 'sigmas' standard deviations from the median of the last 'window' readings
+('hampel', window, sigmas, min_sigma) - as above, but the standard deviation is never taken to be less than 'min_sigma'
+    (if most readings in the window are identical, any different reading is flagged unless 'min_sigma' is set, e.g. 1 for particulate matter)
+('median', window) - replaces each reading with the median of the last 'window' readings
+('ema', alpha) - exponential moving average, alpha between 0 and 1 (smaller values smooth more)
+i.e. to flag spikes in carbon monoxide and particulate matter readings, and smooth particulate matter readings, write
+{5: [('hampel', 7, 3)], 8: [('hampel', 7, 3), ('median', 3)]}
+'''
+filters = {}
+
+
+'''
+STORAGE LIMITS
+
+Data files are stored on the Raspberry Pi's SD card. To stop long deployments from filling the SD card:
+- each data file is split into segments once it reaches 'segment_size_kb' kilobytes, and full segments are compressed
+- once all data files take up more than 'storage_quota_mb' megabytes, the oldest files which have already been emailed are deleted
+- readings are skipped (instead of the sensor crashing) if less than 'min_free_space_mb' megabytes would be left free on the SD card
+'''
+storage_quota_mb = 1024
+
+segment_size_kb = 512
+
+min_free_space_mb = 50
+
+'''
+DATA STORAGE FORMAT
+
+Set 'storage_backend' to 'csv' to save each reading straight to a CSV file (one file per sensor), 
+or to 'sqlite' to save readings to a database on the Raspberry Pi, which is safer if power fails and writes to the SD card less often.
+With 'sqlite', readings are written to the database every 'sqlite_flush_interval' seconds, and CSV files are created from the database 
+once readings are complete, so the emailed files are the same.
+'''
+storage_backend = 'csv'
+
+sqlite_flush_interval = 10
+
+
+'''
+LIVE READINGS
+
+Set 'publish_readings' to True to send readings to an MQTT broker (e.g. Mosquitto) while they are being taken, so they can be monitored live
+(requires 'paho-mqtt': 'pip3 install paho-mqtt'). Readings from each Raspberry Pi are published to the topic 'mqtt_topic/<hostname>'.
+Readings are sent in batches every 'publish_interval_ms' milliseconds, or sooner once 'publish_batch_size' readings are waiting.
+If the broker cannot be reached, batches are saved on the SD card (up to 'publish_queue_mb' megabytes, oldest removed first) and sent once it can be reached again.
+Readings are still saved to the data files and emailed as normal.
+'''
+publish_readings = False
+
+mqtt_host = 'localhost'
+
+mqtt_port = 1883
+
+mqtt_topic = 'ecoswell'
+
+publish_interval_ms = 1000
+
+publish_batch_size = 50
+
+publish_queue_mb = 10
+
+
+'''
+LCD DASHBOARD
+
+Set 'dashboard' to True to show the latest reading of each active sensor on the LCD screen while readings are being taken,
+along with a graph of its last 'dashboard_history' readings. Each sensor is shown for 'dashboard_page_secs' seconds in turn,
+and the screen is updated at most 'dashboard_fps' times per second. The LCD stays on until all readings are complete.
+'''
+dashboard = False
+
+dashboard_history = 60
+
+dashboard_page_secs = 5
+
+dashboard_fps = 2
+
+
+'''
+READING QUEUE
+
+Readings which are due are queued and taken one at a time, earliest deadline first. If a sensor is due again before its last reading was taken 
+(e.g. the reading frequency is shorter than the time taken to read the sensors), only one reading is taken.
+'work_queue_size' is the maximum number of readings which can wait in the queue. As only one reading of each sensor can wait at a time, the queue
+can never hold more readings than there are active sensors (at most 8), so this limit only has an effect if it is set below the number of active sensors.
+If the queue is full, set 'work_queue_drop' to 'oldest' to remove the reading which has waited longest, or to 'newest' to skip the new reading. 
+The number of late, merged and dropped readings is saved in 'code/queue_stats.txt' once readings are complete.
+'''
+work_queue_size = 8
+
+work_queue_drop = 'oldest'
+
+
+'''
+SEPARATE ACQUISITION PROCESSES
+
+Set 'acquisition_processes' to True to read the particulate matter sensor (serial) and the other sensors (I2C) in separate processes,
+so a slow or failed particulate matter reading does not delay the other sensors.
+'acquisition_buffer_size' is the number of readings each process can hold before they are saved - readings beyond this are dropped
+(the number dropped is saved in 'code/queue_stats.txt' once readings are complete).
+'''
+acquisition_processes = False
+
+acquisition_buffer_size = 256
+
+'''
+FAST START
+
+Set 'fast_start' to True to make the proximity sensor 'button' respond within a second of the Raspberry Pi turning on.
+The other sensors and the LCD are then only set up when first needed, and the internet connection is checked in the background.
+The time taken by each stage of start up is saved to 'code/startup_timing.txt' on the Raspberry Pi.
+'''
+fast_start = False
+
 """
 TECHNICAL INFORMATION
 